@@ -4,10 +4,13 @@ import json
 import os
 from datetime import datetime
 from pathlib import Path
+import db_utils
 from db_utils import init_db, insert_sales_from_csv, get_sales
+from metricas_utils import ativar_exportacao
+from ingest_worker import iniciar_worker
 from auth_utils import authenticate, get_user_profile, load_users, save_users
 from interface_blocks import (
-    login_block, pagina_admin_usuarios, pagina_usuario, dashboard_diario,
+    login_block, pagina_admin_usuarios, pagina_admin_desempenho, pagina_admin_metas, pagina_usuario, dashboard_diario,
     dashboard_clientes, dashboard_temporal, dashboard_devolucoes, dashboard_transportadoras, dashboard_condicao_pagamento,
     sidebar_customizada
 )
@@ -16,6 +19,10 @@ from interface_blocks import (
 # Inicialização do banco de dados
 # =====================
 init_db()
+# Métricas no formato do Prometheus, ao lado do banco (só o app grava; scripts e testes não)
+ativar_exportacao(Path(db_utils.DB_FILE).parent / "metricas.prom")
+# Retoma importações interrompidas e deixa o worker pronto para novos uploads
+iniciar_worker()
 
 # =====================
 # Configurações Gerais
@@ -56,6 +63,10 @@ else:
     # Renderização das páginas
     if st.session_state.pagina == "admin_usuarios" and perfil == "admin":
         pagina_admin_usuarios()
+    elif st.session_state.pagina == "admin_desempenho" and perfil == "admin":
+        pagina_admin_desempenho()
+    elif st.session_state.pagina == "admin_metas" and perfil == "admin":
+        pagina_admin_metas()
     elif st.session_state.pagina == "usuario":
         pagina_usuario()
     else:
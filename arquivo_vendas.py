@@ -0,0 +1,128 @@
+# Arquiva meses fechados: as linhas de vendas de cada mês vão para um Parquet
+# comprimido (data/arquivo/vendas_AAAA-MM.parquet, ao lado do banco) e saem da tabela.
+# Agregados diários e a dimensão clientes continuam no banco, então os dashboards não
+# mudam; consultas linha a linha que pegam esses meses leem os arquivos sob demanda
+# (ver db_utils.conexao_vendas). Importações com linhas de meses arquivados as recusam.
+#
+#   python arquivo_vendas.py --listar
+#   python arquivo_vendas.py --ate 2024-12 --vacuum     # arquiva todos os meses fechados até dez/2024
+import argparse
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+
+import db_utils
+
+COMPRESSAO_PARQUET = 'zstd'
+
+def _validar_mes(mes):
+    try:
+        return pd.Period(mes, freq='M').strftime('%Y-%m')
+    except ValueError:
+        raise ValueError(f"Mês inválido (use AAAA-MM): {mes}") from None
+
+def mes_fechado(mes, hoje=None):
+    # Só meses anteriores ao mês corrente podem ser arquivados
+    return _validar_mes(mes) < (hoje or date.today()).strftime('%Y-%m')
+
+def meses_arquivaveis(ate=None, hoje=None):
+    # Meses com vendas no banco, fechados e ainda não arquivados, até "ate" (AAAA-MM)
+    with db_utils.conexao_leitura() as conn:
+        meses = [linha[0] for linha in conn.execute(
+            "SELECT DISTINCT substr(dia, 1, 7) FROM rollup_dia ORDER BY 1"
+        )]
+        arquivados = db_utils._meses_arquivados(conn)
+    ate = _validar_mes(ate) if ate else None
+    return [
+        m for m in meses
+        if m not in arquivados and mes_fechado(m, hoje) and (ate is None or m <= ate)
+    ]
+
+def arquivar_mes(mes, hoje=None):
+    # Grava o Parquet do mês, confere a releitura e só então apaga as linhas do banco,
+    # tudo dentro de uma transação. Retorna o registro gravado em particoes_arquivadas.
+    mes = _validar_mes(mes)
+    if not mes_fechado(mes, hoje):
+        raise ValueError(f"O mês {mes} ainda não fechou")
+    inicio, fim = f"{mes}-01", f"{mes}-31"
+    diretorio = db_utils.diretorio_arquivo()
+    diretorio.mkdir(parents=True, exist_ok=True)
+    arquivo = f"vendas_{mes}.parquet"
+    colunas = ['id'] + list(db_utils.COLUNAS_VENDAS)
+    with db_utils.conexao_escrita() as conn:
+        with conn:
+            if mes in db_utils._meses_arquivados(conn):
+                raise ValueError(f"O mês {mes} já está arquivado")
+            # Agregados em dia antes de as linhas saírem da tabela
+            db_utils._atualizar_rollups(conn)
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(colunas)} FROM vendas WHERE data_competencia BETWEEN ? AND ? ORDER BY data_competencia, id",
+                conn, params=[inicio, fim]
+            )
+            if df.empty:
+                raise ValueError(f"Sem vendas em {mes}")
+            temporario = diretorio / f".{arquivo}.tmp"
+            df.to_parquet(temporario, engine='pyarrow', compression=COMPRESSAO_PARQUET, index=False)
+            with open(temporario, 'rb') as f:
+                os.fsync(f.fileno())
+            if len(pd.read_parquet(temporario, engine='pyarrow', columns=['id'])) != len(df):
+                temporario.unlink(missing_ok=True)
+                raise OSError(f"Falha ao conferir o arquivo de {mes}")
+            os.replace(temporario, diretorio / arquivo)
+            registro = {
+                'mes': mes,
+                'arquivo': arquivo,
+                'linhas': len(df),
+                'valor': float(df['valor'].sum()),
+                'bytes': (diretorio / arquivo).stat().st_size,
+                'hash': db_utils.hash_arquivo_em_disco(diretorio / arquivo),
+            }
+            conn.execute("DELETE FROM vendas WHERE data_competencia BETWEEN ? AND ?", (inicio, fim))
+            # Os gatilhos marcaram os dias do mês como pendentes; recalculá-los a partir da
+            # tabela, agora vazia nesses dias, apagaria os agregados que devem ficar
+            conn.execute("DELETE FROM dias_pendentes WHERE dia BETWEEN ? AND ?", (inicio, fim))
+            conn.execute(
+                "INSERT INTO particoes_arquivadas (mes, arquivo, linhas, valor, bytes, hash) VALUES (?, ?, ?, ?, ?, ?)",
+                tuple(registro.values())
+            )
+            db_utils._incrementar_versao_dados(conn)
+    return registro
+
+def compactar():
+    # VACUUM devolve ao disco o espaço das linhas arquivadas; não pode rodar numa transação
+    with db_utils.conexao_escrita() as conn:
+        conn.execute("VACUUM")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Arquiva meses fechados de vendas em Parquet.")
+    parser.add_argument('meses', nargs='*', help="meses a arquivar (AAAA-MM)")
+    parser.add_argument('--ate', help="arquiva todos os meses fechados até este (AAAA-MM)")
+    parser.add_argument('--listar', action='store_true', help="mostra os meses já arquivados")
+    parser.add_argument('--vacuum', action='store_true', help="compacta o banco depois de arquivar")
+    parser.add_argument('--db', default=str(db_utils.DB_FILE), help="arquivo do banco SQLite")
+    args = parser.parse_args(argv)
+
+    db_utils.configurar_db(args.db)
+    db_utils.init_db()
+    if args.listar:
+        print(db_utils.particoes_arquivadas().to_string(index=False))
+        return 0
+    meses = args.meses or (meses_arquivaveis(args.ate) if args.ate else [])
+    if not meses:
+        print("Nenhum mês para arquivar.")
+        return 0
+    for mes in meses:
+        try:
+            registro = arquivar_mes(mes)
+        except ValueError as erro:
+            print(f"{mes}: {erro}")
+            continue
+        print(f"{mes}: {registro['linhas']:,} linhas -> {registro['arquivo']} ({registro['bytes'] / 1024:,.0f} KB)")
+    if args.vacuum:
+        compactar()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,25 @@
-import json
-from pathlib import Path
-
-DATA_DIR = Path("data")
-USERS_FILE = DATA_DIR / "usuarios.json"
-USERS_DEFAULT = {
-    "admin": {"senha": "admin123", "perfil": "admin"},
-    "usuario": {"senha": "usuario123", "perfil": "comum"}
-}
+# Funções de autenticação usadas pela interface; os dados ficam em user_store.STORE
+# (cache em memória, gravação atômica e senhas com hash)
+from user_store import DATA_DIR, USERS_FILE, USERS_DEFAULT, STORE
 
 def load_users():
-    if not USERS_FILE.exists():
-        with open(USERS_FILE, "w") as f:
-            json.dump(USERS_DEFAULT, f, indent=4)
-    with open(USERS_FILE) as f:
-        return json.load(f)
+    return STORE.usuarios()
 
 def save_users(users):
-    with open(USERS_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+    STORE.substituir(users)
+
+def add_user(username, password, profile, filiais=None):
+    return STORE.adicionar_usuario(username, password, profile, filiais)
 
 def authenticate(username, password):
-    users = load_users()
-    return username in users and users[username]['senha'] == password
+    return STORE.autenticar(username, password)
 
 def get_user_profile(username):
-    return load_users()[username]['perfil'] 
\ No newline at end of file
+    return STORE.perfil(username)
+
+def get_user_filiais(username):
+    # Filiais que o usuário pode ver (tupla ordenada) ou None para todas
+    return STORE.filiais(username)
+
+def logout(username):
+    STORE.encerrar_sessao(username)
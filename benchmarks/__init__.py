@@ -0,0 +1,2 @@
+# Scripts de medição de desempenho do dashboard. Rodam sem o Streamlit,
+# sempre sobre um banco temporário: python -m benchmarks.<script>
@@ -0,0 +1,140 @@
+# Gera exports sintéticos no formato do sistema de vendas ("Diario dd-mm.csv"):
+# separador ';', encoding latin1 e o cabeçalho acentuado com ~60 colunas que
+# csv_utils.padronizar_colunas espera.
+#
+#   python -m benchmarks.gerador_diario "Diario sintetico.csv" --linhas 100000
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from csv_utils import ENCODING_CSV, SEPARADOR_CSV
+
+# Cabeçalho na ordem do export, com as colunas repetidas ("Código", "Valor Seguro")
+CABECALHO_DIARIO = [
+    'Data Competência', 'Hora', 'Nº Venda', 'Nº NF', 'Código', 'Código', 'Código', 'Parceiro',
+    'Quantidade', 'Valor', 'Acréscimo', 'Desconto', 'Total', 'Desp. Acess.', 'Valor Frete CIF',
+    'Valor Seguro', 'Valor Seguro', 'Total Venda', 'Percentual Desc.', 'Total Preço Base', 'Operação',
+    'N D', 'N E', 'C', 'Nº C. Fiscal', 'Nº Vendedor', 'Vendedor', 'Tipo da Condição', 'Data Saída',
+    'Forma', 'Transportadora', 'Tipo Frete', 'Valor Frete', 'Placa', 'UF Placa', 'Espécie', 'Marca',
+    'Quantidade Volume', 'Peso Bruto', 'Peso Líquido', 'Obs.', 'Nº Loja CF', 'Nº Cx CF',
+    'Nº Série Imp CF', 'Endereço Entrega', 'Bairro Entrega', 'Cidade Entrega', 'CEP Entrega',
+    'UF Entrega', 'Filial', 'Operador', 'Operador Cancelamento', 'Cód', 'Nome Motorista',
+    'Operador Entrega', 'Data Entrega', 'Nome Autorizado', 'Sit. Email', 'N. Pedido', 'Obra',
+    'Desc. Obra', 'Nº Despacho',
+]
+
+# Linhas geradas por vez: limita a memória ao gerar arquivos de 1M linhas
+LINHAS_POR_BLOCO = 100_000
+
+def _moeda(valores):
+    # 1234.5 -> "1.234,50", como no export
+    texto = pd.Series(valores).map('{:,.2f}'.format)
+    return texto.str.replace(',', '_', regex=False).str.replace('.', ',', regex=False).str.replace('_', '.', regex=False)
+
+def _escolher(rnd, opcoes, linhas, pesos=None):
+    return np.asarray(opcoes, dtype=object)[rnd.choice(len(opcoes), linhas, p=pesos)]
+
+def _bloco(rnd, primeira_linha, linhas, dias, itens_por_venda):
+    numero = primeira_linha + np.arange(linhas)
+    venda = numero // itens_por_venda + 100000
+    quantidade = rnd.integers(1, 25, linhas)
+    unitario = rnd.gamma(2.0, 60.0, linhas).round(2)
+    total = quantidade * unitario
+    devolucao = rnd.random(linhas) < 0.02
+    quantidade = np.where(devolucao, -quantidade, quantidade)
+    total = np.where(devolucao, -total, total)
+    # dias já vem formatado (DD/MM/AAAA); várias linhas da mesma venda caem no mesmo dia
+    data = dias[(venda * 7919) % len(dias)]
+    filial = _escolher(rnd, ['01', '02', '03', '04', '05'], linhas, [0.4, 0.2, 0.2, 0.1, 0.1])
+    colunas = [
+        data,
+        [f"{h:02d}:{m:02d}" for h, m in zip(rnd.integers(7, 19, linhas), rnd.integers(0, 60, linhas))],
+        venda.astype(str),
+        (venda + 500000).astype(str),
+        [f"{c:05d}" for c in rnd.zipf(1.3, linhas) % 8000],
+        rnd.integers(1, 99999, linhas).astype(str),
+        rnd.integers(1, 99999, linhas).astype(str),
+        [f"CLIENTE {c:05d} LTDA" for c in rnd.zipf(1.2, linhas) % 30000],
+        quantidade.astype(str),
+        _moeda(total),
+        '0,00',
+        _moeda((total * rnd.choice([0, 0.05], linhas)).round(2)),
+        _moeda(total),
+        '0,00',
+        '0,00',
+        '0,00',
+        '0,00',
+        _moeda(total),
+        '0,00',
+        _moeda(total),
+        np.where(devolucao, 'DEVOLUÇÃO DE VENDA', 'VENDA MERCADORIA'),
+        _escolher(rnd, ['S', 'N'], linhas),
+        _escolher(rnd, ['S', 'N'], linhas),
+        _escolher(rnd, ['', 'X'], linhas),
+        rnd.integers(1, 999999, linhas).astype(str),
+        rnd.integers(1, 40, linhas).astype(str),
+        [f"VENDEDOR {v:02d}" for v in rnd.integers(1, 40, linhas)],
+        _escolher(rnd, ['À VISTA', 'A PRAZO', '30/60/90', 'CARTÃO'], linhas),
+        data,
+        _escolher(rnd, ['DINHEIRO', 'PIX', 'CARTÃO DE CRÉDITO', 'CARTÃO DE DÉBITO', 'BOLETO', 'CHEQUE'], linhas),
+        _escolher(rnd, ['', 'TRANSPORTES SÃO JOSÉ', 'RODOVIÁRIO ARAÚJO', 'EXPRESSO PARANÁ'], linhas),
+        _escolher(rnd, ['CIF', 'FOB', ''], linhas),
+        '0,00',
+        _escolher(rnd, ['', 'ABC1D23', 'XYZ9K88'], linhas),
+        _escolher(rnd, ['', 'SP', 'MG'], linhas),
+        _escolher(rnd, ['', 'CAIXA', 'VOLUME'], linhas),
+        '',
+        rnd.integers(0, 10, linhas).astype(str),
+        _moeda(rnd.uniform(0, 500, linhas)),
+        _moeda(rnd.uniform(0, 500, linhas)),
+        _escolher(rnd, ['', 'ENTREGAR PELA MANHÃ', 'CLIENTE RETIRA'], linhas),
+        '', '', '',
+        [f"RUA {r} Nº {n}" for r, n in zip(rnd.integers(1, 500, linhas), rnd.integers(1, 3000, linhas))],
+        _escolher(rnd, ['CENTRO', 'JARDIM AMÉRICA', 'VILA SÃO JOÃO', 'INDUSTRIAL'], linhas),
+        _escolher(rnd, ['SÃO PAULO', 'CAMPINAS', 'RIBEIRÃO PRETO', 'SÃO JOSÉ DOS CAMPOS', 'JUNDIAÍ'], linhas),
+        [f"{c:05d}-000" for c in rnd.integers(1000, 99999, linhas)],
+        'SP',
+        filial,
+        _escolher(rnd, ['JOÃO', 'MARIA', 'CONCEIÇÃO'], linhas),
+        '',
+        rnd.integers(1, 999, linhas).astype(str),
+        _escolher(rnd, ['', 'ANTÔNIO', 'JOSÉ'], linhas),
+        '',
+        data,
+        '',
+        _escolher(rnd, ['', 'ENVIADO'], linhas),
+        rnd.integers(1, 99999, linhas).astype(str),
+        '', '',
+        rnd.integers(1, 99999, linhas).astype(str),
+    ]
+    df = pd.DataFrame({i: coluna for i, coluna in enumerate(colunas)}, index=range(linhas))
+    df.columns = CABECALHO_DIARIO
+    return df
+
+def gerar_diario(destino, linhas, semente=42, inicio='2024-01-01', dias=365, itens_por_venda=3):
+    # Escreve "linhas" itens de venda distribuídos em "dias" dias a partir de "inicio"
+    rnd = np.random.default_rng(semente)
+    calendario = pd.date_range(inicio, periods=dias).strftime('%d/%m/%Y').to_numpy(dtype=object)
+    primeira = True
+    for deslocamento in range(0, linhas, LINHAS_POR_BLOCO):
+        bloco = _bloco(rnd, deslocamento, min(LINHAS_POR_BLOCO, linhas - deslocamento), calendario, itens_por_venda)
+        bloco.to_csv(
+            destino, sep=SEPARADOR_CSV, encoding=ENCODING_CSV, index=False,
+            header=primeira, mode='w' if primeira else 'a'
+        )
+        primeira = False
+    return destino
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera um CSV diário sintético.")
+    parser.add_argument('destino')
+    parser.add_argument('--linhas', type=int, default=10_000)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--semente', type=int, default=42)
+    args = parser.parse_args(argv)
+    gerar_diario(args.destino, args.linhas, args.semente, dias=args.dias)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,99 @@
+# Compara o DataFrame de vendas "cru" (texto em object, como sai do read_sql) com o
+# tipado de db_utils.tipar_vendas: memória ocupada e latência das operações que os
+# dashboards fazem. Com --db, lê as vendas de um banco existente em vez de gerar.
+#
+#   python -m benchmarks.memoria_vendas --linhas 1000000
+import argparse
+import sqlite3
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+import db_utils
+
+def vendas_sinteticas(linhas, semente=42):
+    # Mesma cardinalidade aproximada de um ano de vendas reais
+    rnd = np.random.default_rng(semente)
+    dias = pd.date_range('2024-01-01', periods=365).strftime('%Y-%m-%d').to_numpy()
+    def rotulos(prefixo, quantos):
+        nomes = np.array([f"{prefixo} {i}" for i in range(1, quantos + 1)], dtype=object)
+        return nomes[rnd.integers(0, quantos, linhas)]
+    return pd.DataFrame({
+        'id': np.arange(1, linhas + 1),
+        'data_competencia': dias[rnd.integers(0, len(dias), linhas)],
+        'numero_venda': (np.arange(linhas) // 3 + 100000).astype(str).astype(object),
+        'codigo_produto': rotulos('P', 5000),
+        'parceiro': rotulos('CLIENTE', 20000),
+        'valor': rnd.uniform(5, 5000, linhas).round(2),
+        'quantidade': rnd.integers(1, 20, linhas),
+        'vendedor': rotulos('VENDEDOR', 40),
+        'forma_pagamento': rotulos('FORMA', 8),
+        'tipo_da_condicao': rotulos('CONDICAO', 12),
+        'filial': rotulos('FILIAL', 6),
+    })
+
+def vendas_do_banco(caminho):
+    with sqlite3.connect(f"file:{caminho}?mode=ro", uri=True) as conn:
+        return pd.read_sql_query("SELECT * FROM vendas", conn)
+
+# Operações típicas dos dashboards. Na representação crua cada uma converte o que
+# precisa, como os dashboards faziam; na tipada as colunas já chegam convertidas.
+OPERACOES = {
+    'faturamento por mês': (
+        lambda df: df.groupby(pd.to_datetime(df['data_competencia']).dt.to_period('M'))['valor'].sum(),
+        lambda df: df.groupby(df['data_competencia'].dt.to_period('M'))['valor'].sum(),
+    ),
+    'top 10 clientes': (
+        lambda df: df.groupby('parceiro')['valor'].sum().nlargest(10),
+        lambda df: df.groupby('parceiro', observed=True)['valor'].sum().nlargest(10),
+    ),
+    'vendas por vendedor': (
+        lambda df: df['vendedor'].value_counts(),
+        lambda df: df['vendedor'].value_counts(),
+    ),
+    'filtro por filial': (
+        lambda df: df[df['filial'] == 'FILIAL 1'],
+        lambda df: df[df['filial'] == 'FILIAL 1'],
+    ),
+    'quantidade total': (
+        lambda df: pd.to_numeric(df['quantidade'], errors='coerce').sum(),
+        lambda df: df['quantidade'].sum(),
+    ),
+}
+
+def cronometrar(funcao, df, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(df)
+        tempos.append(time.perf_counter() - inicio)
+    return statistics.median(tempos)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memória e latência: vendas cruas x tipadas.")
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--db', help="ler as vendas deste banco em vez de gerar dados sintéticos")
+    args = parser.parse_args(argv)
+
+    cru = vendas_do_banco(args.db) if args.db else vendas_sinteticas(args.linhas)
+    inicio = time.perf_counter()
+    tipado = db_utils.tipar_vendas(cru.copy())
+    conversao = time.perf_counter() - inicio
+
+    mb_cru = cru.memory_usage(deep=True).sum() / 1024 ** 2
+    mb_tipado = tipado.memory_usage(deep=True).sum() / 1024 ** 2
+    print(f"{len(cru):,} linhas")
+    print(f"Memória: cru {mb_cru:,.1f} MB | tipado {mb_tipado:,.1f} MB ({mb_tipado / mb_cru:.0%})")
+    print(f"Conversão única (tipar_vendas): {conversao * 1000:,.0f} ms\n")
+    print(f"{'operação':<22}{'cru (ms)':>12}{'tipado (ms)':>14}")
+    for nome, (op_cru, op_tipado) in OPERACOES.items():
+        t_cru = cronometrar(op_cru, cru, args.repeticoes)
+        t_tipado = cronometrar(op_tipado, tipado, args.repeticoes)
+        print(f"{nome:<22}{t_cru * 1000:>12,.1f}{t_tipado * 1000:>14,.1f}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+# Teste de estresse do acesso concorrente ao SQLite: um escritor ingerindo lotes
+# enquanto vários leitores simulam dashboards. Falha se algum leitor ou o escritor
+# receber erro (ex.: "database is locked").
+#
+#   python -m benchmarks.stress_sqlite --leitores 16 --segundos 20
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import db_utils
+
+def lote_sintetico(inicio_venda, linhas, semente):
+    rnd = random.Random(semente)
+    dias = pd.date_range('2024-01-01', periods=365)
+    return pd.DataFrame({
+        'data_competencia': [rnd.choice(dias).strftime('%d/%m/%Y') for _ in range(linhas)],
+        'numero_venda': [str(inicio_venda + i) for i in range(linhas)],
+        'codigo_produto': [f"P{rnd.randint(1, 300)}" for _ in range(linhas)],
+        'parceiro': [f"CLIENTE {rnd.randint(1, 2000)}" for _ in range(linhas)],
+        'valor': [f"{rnd.uniform(5, 5000):.2f}".replace('.', ',') for _ in range(linhas)],
+        'quantidade': [str(rnd.randint(1, 20)) for _ in range(linhas)],
+        'vendedor': [f"VENDEDOR {rnd.randint(1, 25)}" for _ in range(linhas)],
+        'filial': [f"{rnd.randint(1, 5):02d}" for _ in range(linhas)],
+    })
+
+# Leituras típicas de um rerun de dashboard, sem passar pelo cache
+LEITURAS = (
+    lambda: db_utils.get_rollup.sem_cache('dia'),
+    lambda: db_utils.get_rollup.sem_cache('parceiro', '2024-03-01', '2024-06-30'),
+    lambda: db_utils.consultar_vendas.sem_cache(colunas=['data_competencia', 'parceiro', 'valor'], limite=30),
+    lambda: db_utils.consultar_vendas.sem_cache(
+        agrupar_por='vendedor', agregacoes={'valor': ('sum', 'valor')}, inicio='2024-01-01', fim='2024-12-31'
+    ),
+)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestão concorrente com leitores simulados")
+    parser.add_argument('--leitores', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=15.0)
+    parser.add_argument('--linhas-por-lote', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix='stress_sqlite_')
+    db_utils.configurar_db(Path(pasta) / 'vendas.db')
+    db_utils.init_db()
+    db_utils.insert_sales_from_csv(lote_sintetico(0, args.linhas_por_lote, 0))
+
+    fim = time.monotonic() + args.segundos
+    erros = []
+    latencias = []
+    lotes = []
+    lock = threading.Lock()
+
+    def escritor():
+        numero = 1
+        while time.monotonic() < fim:
+            df = lote_sintetico(numero * args.linhas_por_lote, args.linhas_por_lote, numero)
+            try:
+                resultado = db_utils.insert_sales_from_csv(df)
+                lotes.append(resultado['segundos'])
+            except Exception as e:
+                erros.append(f"escritor: {e!r}")
+            numero += 1
+
+    def leitor(semente):
+        rnd = random.Random(semente)
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                rnd.choice(LEITURAS)()
+            except Exception as e:
+                erros.append(f"leitor {semente}: {e!r}")
+                continue
+            with lock:
+                latencias.append(time.perf_counter() - inicio)
+
+    threads = [threading.Thread(target=escritor)]
+    threads += [threading.Thread(target=leitor, args=(i,)) for i in range(args.leitores)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    print(f"Banco: {db_utils.DB_FILE}")
+    print(f"Lotes ingeridos: {len(lotes)} de {args.linhas_por_lote} linhas "
+          f"(média {statistics.mean(lotes) if lotes else 0:.2f}s por lote)")
+    if latencias:
+        quantis = statistics.quantiles(latencias, n=100)
+        print(f"Leituras: {len(latencias)} | p50 {quantis[49] * 1000:.1f} ms | "
+              f"p95 {quantis[94] * 1000:.1f} ms | p99 {quantis[98] * 1000:.1f} ms")
+    print(f"Erros: {len(erros)}")
+    for erro in erros[:10]:
+        print(f"  {erro}")
+    return 1 if erros else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
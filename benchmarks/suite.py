@@ -0,0 +1,214 @@
+# Suíte de desempenho sem interface: para cada tamanho gera um CSV diário sintético,
+# importa num banco temporário e mede a importação, get_sales e a parte de cálculo de
+# cada dashboard_* (com o Streamlit substituído por um objeto que não desenha nada).
+# Grava tempos e pico de memória em JSON; com --comparar, falha (código 1) se alguma
+# medição ficar mais lenta que a base além do limite.
+#
+#   python -m benchmarks.suite --tamanhos 10000 100000 --saida bench.json
+#   python -m benchmarks.suite --comparar bench.json --limite 0.2
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use('Agg')
+import pandas as pd
+
+import db_utils
+import interface_blocks
+from benchmarks.gerador_diario import gerar_diario
+from cache_utils import CACHE
+from csv_utils import ENCODING_CSV, SEPARADOR_CSV, padronizar_colunas
+
+TAMANHOS_PADRAO = (10_000, 100_000)
+# Diferenças menores que isto são ruído e não contam como regressão
+TOLERANCIA_SEGUNDOS = 0.005
+
+class StreamlitFalso:
+    # Aceita qualquer chamada do Streamlit e não desenha nada; botões nunca são clicados
+    def __init__(self):
+        self.session_state = {}
+
+    def __getattr__(self, nome):
+        return self._qualquer
+
+    def _qualquer(self, *args, **kwargs):
+        return self
+
+    def columns(self, spec, **kwargs):
+        return [self] * (spec if isinstance(spec, int) else len(spec))
+
+    def tabs(self, rotulos):
+        return [self] * len(rotulos)
+
+    def button(self, *args, **kwargs):
+        return False
+
+    download_button = checkbox = button
+
+    # Widgets de escolha devolvem o valor padrão, como na primeira execução de uma sessão
+    def selectbox(self, rotulo, opcoes, index=0, **kwargs):
+        return list(opcoes)[index]
+
+    radio = selectbox
+
+    def multiselect(self, *args, **kwargs):
+        return []
+
+    def text_input(self, *args, **kwargs):
+        return ''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def __iter__(self):
+        return iter(())
+
+    @property
+    def sidebar(self):
+        return self
+
+def _aproximado(dashboard):
+    # O mesmo dashboard com a chave "Modo aproximado" da barra lateral ligada
+    def medir_aproximado():
+        interface_blocks.st.session_state['modo_aproximado'] = True
+        try:
+            dashboard()
+        finally:
+            interface_blocks.st.session_state.pop('modo_aproximado')
+    return medir_aproximado
+
+DASHBOARDS = {
+    'dashboard_diario': lambda: interface_blocks.dashboard_diario('comum'),
+    'dashboard_clientes': lambda: interface_blocks.dashboard_clientes(),
+    'dashboard_clientes_aproximado': _aproximado(lambda: interface_blocks.dashboard_clientes()),
+    'dashboard_temporal': lambda: interface_blocks.dashboard_temporal(),
+    'dashboard_devolucoes': lambda: interface_blocks.dashboard_devolucoes(),
+    'dashboard_transportadoras': lambda: interface_blocks.dashboard_transportadoras(),
+    'dashboard_condicao_pagamento': lambda: interface_blocks.dashboard_condicao_pagamento(),
+}
+
+def _importar(caminho_csv):
+    df = pd.read_csv(caminho_csv, sep=SEPARADOR_CSV, encoding=ENCODING_CSV, dtype=str, keep_default_na=False)
+    return db_utils.insert_sales_from_csv(padronizar_colunas(df))
+
+def _pico_mb(funcao):
+    # Pico de memória alocada pelo Python/numpy durante a chamada (rodada separada,
+    # porque o tracemalloc deixa as chamadas bem mais lentas)
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    finally:
+        tracemalloc.stop()
+
+def _medir(funcao, repeticoes, antes=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if antes:
+            antes()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    if antes:
+        antes()
+    return {'segundos': statistics.median(tempos), 'pico_mb': _pico_mb(funcao)}
+
+def medir_tamanho(linhas, diretorio, repeticoes=3):
+    caminho_csv = Path(diretorio) / f"Diario {linhas}.csv"
+    gerar_diario(caminho_csv, linhas)
+    resultados = {}
+
+    # Importação: cada rodada precisa de um banco novo
+    tempos, pico = [], None
+    for rodada in range(repeticoes + 1):
+        db_utils.configurar_db(Path(diretorio) / f"vendas_{linhas}_{rodada}.db")
+        db_utils.init_db()
+        if rodada == repeticoes:
+            pico = _pico_mb(lambda: _importar(caminho_csv))
+        else:
+            inicio = time.perf_counter()
+            _importar(caminho_csv)
+            tempos.append(time.perf_counter() - inicio)
+    resultados['insert_sales_from_csv'] = {
+        'segundos': statistics.median(tempos), 'pico_mb': pico,
+        'linhas_por_segundo': linhas / statistics.median(tempos),
+    }
+
+    # Leituras e dashboards sempre com o cache vazio (pior caso de um rerun)
+    resultados['get_sales'] = _medir(db_utils.get_sales, repeticoes, antes=CACHE.limpar)
+    interface_blocks.st = StreamlitFalso()
+    interface_blocks.st.session_state['periodo'] = db_utils.intervalo_datas()
+    # Painéis de um usuário sem restrição de filial, sem ler o cadastro de usuários
+    interface_blocks.filiais_usuario = lambda: None
+    for nome, dashboard in DASHBOARDS.items():
+        resultados[nome] = _medir(dashboard, repeticoes, antes=CACHE.limpar)
+    return resultados
+
+def comparar(atual, base, limite):
+    # Lista as medições que ficaram mais de "limite" (fração) mais lentas que a base
+    regressoes = []
+    for tamanho, medicoes in atual['resultados'].items():
+        for nome, medicao in medicoes.items():
+            anterior = base.get('resultados', {}).get(tamanho, {}).get(nome)
+            if not anterior:
+                continue
+            diferenca = medicao['segundos'] - anterior['segundos']
+            if diferenca > TOLERANCIA_SEGUNDOS and medicao['segundos'] > anterior['segundos'] * (1 + limite):
+                regressoes.append((tamanho, nome, anterior['segundos'], medicao['segundos']))
+    return regressoes
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede importação, leituras e dashboards com dados sintéticos.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=list(TAMANHOS_PADRAO),
+                        help="linhas por CSV gerado (ex.: 10000 100000 1000000)")
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--saida', help="arquivo JSON com os resultados")
+    parser.add_argument('--comparar', help="JSON de uma rodada anterior usado como base")
+    parser.add_argument('--limite', type=float, default=0.2, help="regressão tolerada (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'resultados': {},
+    }
+    banco_original = db_utils.DB_FILE
+    with tempfile.TemporaryDirectory() as diretorio:
+        try:
+            for linhas in args.tamanhos:
+                print(f"== {linhas:,} linhas", flush=True)
+                medicoes = medir_tamanho(linhas, diretorio, args.repeticoes)
+                relatorio['resultados'][str(linhas)] = medicoes
+                for nome, medicao in medicoes.items():
+                    print(f"  {nome:<30}{medicao['segundos'] * 1000:>10,.1f} ms{medicao['pico_mb']:>10,.1f} MB")
+        finally:
+            db_utils.configurar_db(banco_original)
+
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(relatorio, indent=2, ensure_ascii=False))
+    if args.comparar:
+        regressoes = comparar(relatorio, json.loads(Path(args.comparar).read_text()), args.limite)
+        for tamanho, nome, antes, depois in regressoes:
+            print(f"REGRESSÃO {tamanho} {nome}: {antes * 1000:,.1f} ms -> {depois * 1000:,.1f} ms")
+        if regressoes:
+            return 1
+        print(f"Sem regressões acima de {args.limite:.0%}.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import dataclasses
+import functools
+import sys
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+
+import pandas as pd
+
+# Memória máxima ocupada pelos resultados guardados, somando todas as sessões
+LIMITE_BYTES = 256 * 1024 * 1024
+
+def _tamanho(valor):
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(_tamanho(v) for v in valor)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamanho(v) for v in valor.values())
+    if dataclasses.is_dataclass(valor) and not isinstance(valor, type):
+        # Resultados do kpi_engine: a memória está nos DataFrames e Series dos campos
+        return sys.getsizeof(valor) + sum(_tamanho(getattr(valor, campo.name)) for campo in dataclasses.fields(valor))
+    return sys.getsizeof(valor)
+
+def _copiar(valor):
+    # Os dashboards alteram os DataFrames recebidos (ex.: criam a coluna "mes"),
+    # então cada chamada recebe a sua cópia, também dentro de tuplas e dataclasses
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy()
+    if isinstance(valor, tuple):
+        return tuple(_copiar(v) for v in valor)
+    if dataclasses.is_dataclass(valor) and not isinstance(valor, type):
+        return dataclasses.replace(valor, **{
+            campo.name: _copiar(getattr(valor, campo.name)) for campo in dataclasses.fields(valor) if campo.init
+        })
+    return valor
+
+def _congelar(valor):
+    # Transforma os argumentos numa chave hashable e estável
+    if isinstance(valor, dict):
+        return tuple(sorted((k, _congelar(v)) for k, v in valor.items()))
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        itens = [_congelar(v) for v in valor]
+        return tuple(sorted(itens, key=repr)) if isinstance(valor, (set, frozenset)) else tuple(itens)
+    if isinstance(valor, (datetime, date, pd.Timestamp)):
+        return pd.Timestamp(valor).isoformat()
+    return valor
+
+class CacheResultados:
+    # Cache LRU compartilhado pelo processo inteiro, limitado pela memória estimada dos itens
+
+    def __init__(self, limite_bytes=LIMITE_BYTES):
+        self.limite_bytes = limite_bytes
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_usados = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0
+        self.invalidacoes = 0
+        self._versao = None
+
+    def trocar_versao(self, versao):
+        # Ao ver um novo token de dados, descarta na hora o que foi calculado com os antigos
+        with self._lock:
+            if versao == self._versao:
+                return
+            self._versao = versao
+            antigas = [chave for chave in self._itens if chave[2] != versao]
+            for chave in antigas:
+                self.bytes_usados -= self._itens.pop(chave)[1]
+            self.invalidacoes += len(antigas)
+
+    def obter(self, chave):
+        with self._lock:
+            if chave in self._itens:
+                self._itens.move_to_end(chave)
+                self.acertos += 1
+                return True, self._itens[chave][0]
+            self.faltas += 1
+            return False, None
+
+    def guardar(self, chave, valor):
+        tamanho = _tamanho(valor)
+        if tamanho > self.limite_bytes:
+            return
+        with self._lock:
+            if chave in self._itens:
+                self.bytes_usados -= self._itens.pop(chave)[1]
+            self._itens[chave] = (valor, tamanho)
+            self.bytes_usados += tamanho
+            while self.bytes_usados > self.limite_bytes:
+                _, (_, tamanho_antigo) = self._itens.popitem(last=False)
+                self.bytes_usados -= tamanho_antigo
+                self.remocoes += 1
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes_usados = 0
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.acertos + self.faltas
+            return {
+                'itens': len(self._itens),
+                'bytes_usados': self.bytes_usados,
+                'limite_bytes': self.limite_bytes,
+                'acertos': self.acertos,
+                'faltas': self.faltas,
+                'remocoes': self.remocoes,
+                'invalidacoes': self.invalidacoes,
+                'taxa_acerto': self.acertos / consultas if consultas else 0.0,
+            }
+
+CACHE = CacheResultados()
+
+def em_cache(versao):
+    # Guarda o resultado da função decorada no CACHE. A chave inclui o token devolvido
+    # por versao(): quando novos dados entram o token muda e as entradas antigas são descartadas.
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            token = versao()
+            CACHE.trocar_versao(token)
+            chave = (func.__module__, func.__qualname__, token, _congelar(args), _congelar(kwargs))
+            encontrado, valor = CACHE.obter(chave)
+            if not encontrado:
+                valor = func(*args, **kwargs)
+                CACHE.guardar(chave, valor)
+            return _copiar(valor)
+        envoltorio.sem_cache = func
+        return envoltorio
+    return decorador
@@ -0,0 +1,157 @@
+import functools
+import io
+from collections import namedtuple
+import pandas as pd
+from metricas_utils import cronometrado
+
+# Formato dos arquivos exportados pelo sistema de vendas ("Diario dd-mm.csv")
+SEPARADOR_CSV = ';'
+ENCODING_CSV = 'latin1'
+
+# Mapeamento completo para todos os campos do CSV (nome limpo -> nome padronizado)
+COL_MAP = {
+    'data_competencia': 'data_competencia',
+    'hora': 'hora',
+    'no_venda': 'numero_venda',
+    'no_nf': 'numero_nf',
+    'codigo': 'codigo_produto',
+    'codigo_1': 'codigo_aux1',
+    'codigo_2': 'codigo_aux2',
+    'parceiro': 'parceiro',
+    'quantidade': 'quantidade',
+    'qtd': 'quantidade',
+    'acrescimo': 'acrescimo',
+    'desconto': 'desconto',
+    'total': 'total',
+    'desp_acess': 'desp_acess',
+    'valor_frete_cif': 'valor_frete_cif',
+    'valor_seguro': 'valor_seguro',
+    'valor_seguro_1': 'valor_seguro_1',
+    'total_venda': 'total_venda',
+    'percentual_desc': 'percentual_desc',
+    'total_preco_base': 'total_preco_base',
+    'operacao': 'operacao',
+    'n_d': 'n_d',
+    'n_e': 'n_e',
+    'c': 'c',
+    'no_c_fiscal': 'numero_c_fiscal',
+    'no_vendedor': 'numero_vendedor',
+    'vendedor': 'vendedor',
+    'tipo_da_condicao': 'tipo_da_condicao',
+    'tipodacondicao': 'tipo_da_condicao',
+    'tipo_condicao': 'tipo_da_condicao',
+    'tipo_da_condicao_1': 'tipo_da_condicao',
+    'data_saida': 'data_saida',
+    'forma': 'forma_pagamento',
+    'transportadora': 'transportadora',
+    'tipo_frete': 'tipo_frete',
+    'valor_frete': 'valor_frete',
+    'placa': 'placa',
+    'uf_placa': 'uf_placa',
+    'especie': 'especie',
+    'marca': 'marca',
+    'quantidade_volume': 'quantidade_volume',
+    'peso_bruto': 'peso_bruto',
+    'peso_liquido': 'peso_liquido',
+    'obs': 'obs',
+    'no_loja_cf': 'numero_loja_cf',
+    'no_cx_cf': 'numero_cx_cf',
+    'no_serie_imp_cf': 'numero_serie_imp_cf',
+    'endereco_entrega': 'endereco_entrega',
+    'bairro_entrega': 'bairro_entrega',
+    'cidade_entrega': 'cidade_entrega',
+    'cep_entrega': 'cep_entrega',
+    'uf_entrega': 'uf_entrega',
+    'filial': 'filial',
+    'operador': 'operador',
+    'operador_cancelamento': 'operador_cancelamento',
+    'cod': 'cod',
+    'nome_motorista': 'nome_motorista',
+    'operador_entrega': 'operador_entrega',
+    'data_entrega': 'data_entrega',
+    'nome_autorizado': 'nome_autorizado',
+    'sit_email': 'sit_email',
+    'n_pedido': 'numero_pedido',
+    'obra': 'obra',
+    'desc_obra': 'desc_obra',
+    'no_despacho': 'numero_despacho',
+    # Adicione outros campos conforme necessário
+}
+
+# Linhas por bloco na leitura em streaming
+TAMANHO_BLOCO = 50000
+
+class EsquemaColunas(namedtuple('EsquemaColunas', ['presentes', 'ausentes'])):
+    # Colunas do mapeamento que existem (presentes) ou não (ausentes) num CSV padronizado
+    def __contains__(self, coluna):
+        return coluna in self.presentes
+
+@functools.lru_cache(maxsize=256)
+def _padronizar_cabecalho(colunas):
+    # Memoizado por assinatura do cabeçalho: os exports diários repetem sempre o mesmo
+    indice = pd.Index(colunas, dtype=object).astype(str)
+    # Remove acentos e caracteres especiais, deixa tudo minúsculo e sem espaços
+    limpos = (
+        indice.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+        .str.strip().str.lower()
+        .str.replace(' ', '_', regex=False).str.replace('.', '', regex=False)
+        .str.replace('(', '_', regex=False).str.replace(')', '_', regex=False)
+    )
+    # Renomear duplicadas: a segunda ocorrência vira nome_1, a terceira nome_2...
+    limpos = pd.Series(limpos, dtype=object)
+    ocorrencia = limpos.groupby(limpos, sort=False).cumcount()
+    unicos = limpos.where(ocorrencia == 0, limpos + '_' + ocorrencia.astype(str))
+    # Aplica o mapeamento; se dois campos caem no mesmo nome (ex.: "Qtd" e "Quantidade"),
+    # só o primeiro é renomeado. Os seguintes ficam com o nome limpo ou, se ele também já
+    # foi usado (o alias veio antes do nome padrão), com um sufixo: nunca há colunas repetidas.
+    finais, usados = [], set()
+    for unico in unicos:
+        nome = COL_MAP.get(unico, unico)
+        if nome in usados:
+            nome, sufixo = unico, 1
+            while nome in usados:
+                nome, sufixo = f"{unico}_{sufixo}", sufixo + 1
+        usados.add(nome)
+        finais.append(nome)
+    finais = tuple(finais)
+    if len(set(finais)) != len(finais):
+        raise ValueError(f"Cabeçalho com colunas repetidas após a padronização: {finais}")
+    presentes = tuple(c for c in dict.fromkeys(COL_MAP.values()) if c in finais)
+    ausentes = tuple(c for c in dict.fromkeys(COL_MAP.values()) if c not in finais)
+    return finais, EsquemaColunas(presentes, ausentes)
+
+def nomes_padronizados(colunas):
+    return list(_padronizar_cabecalho(tuple(colunas))[0])
+
+@cronometrado()
+def padronizar_colunas_enxuto(df):
+    # Padroniza os nomes sem criar colunas vazias; devolve (df, EsquemaColunas)
+    nomes, esquema = _padronizar_cabecalho(tuple(df.columns))
+    df.columns = list(nomes)
+    return df, esquema
+
+@cronometrado()
+def padronizar_colunas(df):
+    df, esquema = padronizar_colunas_enxuto(df)
+    # Garante que todas as colunas do mapeamento existam, mesmo que vazias
+    if esquema.ausentes:
+        df = df.assign(**{col: '' for col in esquema.ausentes})
+    return df
+
+def ler_csv_em_blocos(origem, tamanho_bloco=TAMANHO_BLOCO):
+    # Lê o CSV em blocos de tamanho fixo, sem carregar o arquivo inteiro. O cabeçalho é
+    # padronizado uma única vez e os valores chegam como texto: a conversão de tipos
+    # fica para a ingestão, bloco a bloco. Não cria as colunas vazias do mapeamento.
+    if isinstance(origem, (bytes, bytearray)):
+        origem = io.BytesIO(origem)
+    leitor = pd.read_csv(
+        origem, sep=SEPARADOR_CSV, encoding=ENCODING_CSV,
+        chunksize=tamanho_bloco, dtype=str, keep_default_na=False
+    )
+    colunas = None
+    with leitor:
+        for bloco in leitor:
+            if colunas is None:
+                colunas = nomes_padronizados(bloco.columns)
+            bloco.columns = colunas
+            yield bloco
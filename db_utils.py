@@ -1,13 +1,173 @@
+import hashlib
+import queue
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 from pathlib import Path
+import hll_utils
+from cache_utils import em_cache
+from metricas_utils import cronometrado
 
 DB_FILE = Path("data/vendas.db")
+# Quantidade de linhas enviadas por chamada de executemany
+TAMANHO_LOTE = 5000
+# Máximo de linhas rejeitadas guardadas no relatório de uma importação
+LIMITE_REJEITADOS = 10000
+# Dias por vez na montagem dos esboços HyperLogLog (ver _recalcular_esbocos)
+DIAS_POR_LOTE_ESBOCOS = 50
 
-def init_db():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("""
+# Colunas persistidas em vendas (além do id) e seus tipos nativos.
+# data_competencia é gravada como data ISO (AAAA-MM-DD).
+COLUNAS_VENDAS = {
+    'data_competencia': 'TEXT',
+    'numero_venda': 'TEXT',
+    'codigo_produto': 'TEXT',
+    'parceiro': 'TEXT',
+    'valor': 'REAL',
+    'quantidade': 'INTEGER',
+    'vendedor': 'TEXT',
+    'forma_pagamento': 'TEXT',
+    'tipo_da_condicao': 'TEXT',
+    'transportadora': 'TEXT',
+    'filial': 'TEXT',
+    'operacao': 'TEXT',
+    'cidade_entrega': 'TEXT',
+    'devolucao': 'INTEGER',
+}
+# Chave de uma linha: devolução/cancelamento repete venda e produto da original
+CHAVE_VENDA = ('numero_venda', 'codigo_produto', 'devolucao')
+# Trechos da operação (em maiúsculas) que marcam devolução ou cancelamento;
+# "DEVOLU" cobre DEVOLUCAO e DEVOLUÇÃO
+TERMOS_DEVOLUCAO = ('DEVOLU', 'CANCEL')
+
+# Agregados diários mantidos pela ingestão: nome -> dimensões além do dia e da filial.
+# Cada um vira a tabela rollup_<nome>, com chave (dia, filial, dimensões...).
+ROLLUPS = {
+    'dia': (),
+    'parceiro': ('parceiro',),
+    'vendedor': ('vendedor',),
+    'produto': ('codigo_produto',),
+    'condicao': ('forma_pagamento', 'tipo_da_condicao'),
+    'transportadora': ('transportadora',),
+}
+
+def _colunas(conn, tabela):
+    return {linha[1] for linha in conn.execute(f"PRAGMA table_info({tabela})")}
+
+def _indice_existe(conn, nome):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (nome,)
+    ).fetchone() is not None
+
+def _tabela_existe(conn, nome):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nome,)
+    ).fetchone() is not None
+
+# ===================== Conexões =====================
+# Leituras usam um pequeno pool de conexões por processo; escritas passam todas por uma
+# única conexão protegida por lock. Com WAL, leitores não esperam o escritor.
+
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -32768",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 30000",
+)
+TAMANHO_POOL_LEITURA = 4
+
+_lock_conexoes = threading.Lock()
+_lock_escrita = threading.RLock()
+_pool = None
+
+class _PoolConexoes:
+    def __init__(self, caminho, tamanho):
+        self.caminho = caminho
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(tamanho)
+        self._escritor = None
+
+    def _abrir(self, somente_leitura):
+        Path(self.caminho).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False)
+        for pragma in PRAGMAS_CONEXAO:
+            conn.execute(pragma)
+        if somente_leitura:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def obter_leitura(self):
+        # Bloqueia se todas as conexões do pool estiverem em uso
+        self._vagas.acquire()
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            try:
+                return self._abrir(somente_leitura=True)
+            except Exception:
+                self._vagas.release()
+                raise
+
+    def devolver_leitura(self, conn):
+        self._livres.put(conn)
+        self._vagas.release()
+
+    def escritor(self):
+        if self._escritor is None:
+            self._escritor = self._abrir(somente_leitura=False)
+        return self._escritor
+
+    def fechar(self):
+        while True:
+            try:
+                self._livres.get_nowait().close()
+            except queue.Empty:
+                break
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+
+def _pool_atual():
+    # Recria o pool se DB_FILE foi trocado (ex.: benchmarks apontando para outro arquivo)
+    global _pool
+    with _lock_conexoes:
+        if _pool is None or _pool.caminho != str(DB_FILE):
+            if _pool is not None:
+                _pool.fechar()
+            _pool = _PoolConexoes(str(DB_FILE), TAMANHO_POOL_LEITURA)
+        return _pool
+
+@contextmanager
+def conexao_leitura():
+    pool = _pool_atual()
+    conn = pool.obter_leitura()
+    try:
+        yield conn
+    finally:
+        pool.devolver_leitura(conn)
+
+@contextmanager
+def conexao_escrita():
+    # Serializa os escritores do processo; a transação fica a cargo de quem chama (with conn:)
+    with _lock_escrita:
+        yield _pool_atual().escritor()
+
+def configurar_db(caminho):
+    global DB_FILE
+    DB_FILE = Path(caminho)
+    _pool_atual()
+
+# ===================== Migrações =====================
+# Cada migração leva o banco da versão N-1 para N (PRAGMA user_version).
+# Devem tolerar bancos criados antes do versionamento, que já podem ter parte das mudanças.
+
+def _migracao_1(conn):
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS vendas (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             data_competencia TEXT,
@@ -16,35 +176,1235 @@ def init_db():
             valor REAL
         )
     """)
-    conn.commit()
-    conn.close()
 
-def insert_sales_from_csv(df):
-    # Espera colunas padronizadas: data_competencia, numero_venda, parceiro, valor
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    inseridos = 0
-    for _, row in df.iterrows():
-        try:
-            cursor.execute("""
-                INSERT INTO vendas (data_competencia, numero_venda, parceiro, valor)
-                VALUES (?, ?, ?, ?)
-            """, (
-                str(row.get('data_competencia', '')),
-                str(row.get('numero_venda', '')),
-                str(row.get('parceiro', '')),
-                float(str(row.get('valor', 0)).replace(',', '.'))
-            ))
-            inseridos += 1
-        except Exception as e:
-            print(f"Erro ao inserir linha: {row.to_dict()} - Erro: {e}")
+def _migracao_2(conn):
+    if 'codigo_produto' not in _colunas(conn, 'vendas'):
+        conn.execute("ALTER TABLE vendas ADD COLUMN codigo_produto TEXT NOT NULL DEFAULT ''")
+    if not _indice_existe(conn, 'ux_vendas_chave'):
+        # Linhas anteriores ao código do produto: os itens de uma mesma venda teriam todos a
+        # chave (numero_venda, ''). Cada uma recebe um código próprio, sem apagar nenhuma.
+        conn.execute("UPDATE vendas SET codigo_produto = 'legado:' || id WHERE codigo_produto = ''")
+        conn.execute("CREATE UNIQUE INDEX ux_vendas_chave ON vendas (numero_venda, codigo_produto)")
+    # Registro de arquivos já importados, chaveado pelo hash do conteúdo
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingestoes (
+            hash TEXT PRIMARY KEY,
+            nome_arquivo TEXT,
+            linhas INTEGER,
+            ingerido_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _migracao_3(conn):
+    existentes = _colunas(conn, 'vendas')
+    for coluna, tipo in COLUNAS_VENDAS.items():
+        if coluna in existentes:
             continue
-    conn.commit()
-    conn.close()
-    print(f"Total de vendas inseridas: {inseridos}")
-
-def get_sales():
-    conn = sqlite3.connect(DB_FILE)
-    df = pd.read_sql_query("SELECT * FROM vendas", conn)
-    conn.close()
-    return df 
\ No newline at end of file
+        padrao = "NOT NULL DEFAULT ''" if tipo == 'TEXT' else ''
+        conn.execute(f"ALTER TABLE vendas ADD COLUMN {coluna} {tipo} {padrao}")
+    # Datas gravadas como texto do CSV (DD/MM/AAAA [hh:mm]) passam para ISO
+    conn.execute("""
+        UPDATE vendas SET data_competencia =
+            substr(data_competencia, 7, 4) || '-' || substr(data_competencia, 4, 2) || '-' || substr(data_competencia, 1, 2)
+        WHERE data_competencia GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]*'
+    """)
+    conn.execute("""
+        UPDATE vendas SET data_competencia = substr(data_competencia, 1, 10)
+        WHERE data_competencia GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]?*'
+    """)
+    conn.execute("""
+        UPDATE vendas SET data_competencia = NULL
+        WHERE data_competencia NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    """)
+
+def _dimensoes_rollup(nome):
+    # Toda linha de agregado é de uma filial, para as consultas restritas por filial
+    return ('filial',) + ROLLUPS[nome]
+
+def _rollup_por_filial(conn, nome):
+    # Agregados criados antes da migração 15 não têm a coluna filial
+    return 'filial' in _colunas(conn, f"rollup_{nome}")
+
+def _criar_rollup(conn, nome):
+    dimensoes = _dimensoes_rollup(nome)
+    chave = ', '.join(('dia',) + dimensoes)
+    colunas_dim = ''.join(f"{d} TEXT NOT NULL DEFAULT '', " for d in dimensoes)
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS rollup_{nome} (
+            dia TEXT NOT NULL,
+            {colunas_dim}
+            valor REAL NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            linhas INTEGER NOT NULL DEFAULT 0,
+            vendas INTEGER NOT NULL DEFAULT 0,
+            clientes INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY ({chave})
+        )
+    """)
+
+def _migracao_4(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vendas_data ON vendas (data_competencia)")
+    for nome in ROLLUPS:
+        _criar_rollup(conn, nome)
+    # Dias alterados desde a última atualização dos agregados. Os gatilhos registram
+    # também o dia antigo quando um upsert muda a data de uma venda. Não usam
+    # INSERT OR IGNORE porque o ON CONFLICT do upsert externo sobrepõe o dos gatilhos.
+    conn.execute("CREATE TABLE IF NOT EXISTS dias_pendentes (dia TEXT PRIMARY KEY)")
+    for nome, evento, registros in (
+        ('trg_vendas_insert', 'INSERT', ('NEW',)),
+        ('trg_vendas_update', 'UPDATE', ('NEW', 'OLD')),
+        ('trg_vendas_delete', 'DELETE', ('OLD',)),
+    ):
+        corpo = ''.join(f"""
+            INSERT INTO dias_pendentes (dia)
+            SELECT {r}.data_competencia WHERE {r}.data_competencia IS NOT NULL
+                AND NOT EXISTS (SELECT 1 FROM dias_pendentes WHERE dia = {r}.data_competencia);"""
+            for r in registros)
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {nome} AFTER {evento} ON vendas BEGIN {corpo}\n        END")
+    conn.execute("""
+        INSERT OR IGNORE INTO dias_pendentes (dia)
+        SELECT DISTINCT data_competencia FROM vendas WHERE data_competencia IS NOT NULL
+    """)
+    _atualizar_rollups(conn)
+
+def _migracao_5(conn):
+    # Índices dos filtros do consultar_vendas; a data vem em segundo para servir a faixa de período
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vendas_parceiro ON vendas (parceiro, data_competencia)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vendas_vendedor ON vendas (vendedor, data_competencia)")
+
+def _migracao_6(conn):
+    # Contador incrementado a cada ingestão que altera dados; invalida o cache de leituras
+    conn.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO controle (chave, valor) VALUES ('versao_dados', 0)")
+
+def _migracao_7(conn):
+    # Fila de importações processadas em segundo plano (ver ingest_worker)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs_ingestao (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT NOT NULL,
+            nome_arquivo TEXT,
+            caminho TEXT,
+            status TEXT NOT NULL DEFAULT 'na_fila',
+            linhas_processadas INTEGER NOT NULL DEFAULT 0,
+            inseridos INTEGER,
+            rejeitados INTEGER,
+            caminho_rejeitados TEXT,
+            erro TEXT,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP,
+            iniciado_em TEXT,
+            finalizado_em TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_ingestao_hash ON jobs_ingestao (hash)")
+
+def _migracao_8(conn):
+    # Relatório de vazão das importações em streaming
+    existentes = _colunas(conn, 'jobs_ingestao')
+    for coluna, tipo in (('bytes', 'INTEGER'), ('segundos', 'REAL')):
+        if coluna not in existentes:
+            conn.execute(f"ALTER TABLE jobs_ingestao ADD COLUMN {coluna} {tipo}")
+
+def _migracao_9(conn):
+    # Índices da tabela paginada: ordenação por valor e filtro por filial com a data em segundo
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vendas_valor ON vendas (valor)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_vendas_filial ON vendas (filial, data_competencia)")
+
+def _migracao_10(conn):
+    # Dimensão de clientes, mantida a partir de rollup_parceiro pela ingestão
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clientes (
+            parceiro TEXT NOT NULL,
+            filial TEXT NOT NULL DEFAULT '',
+            primeira_compra TEXT NOT NULL,
+            ultima_compra TEXT NOT NULL,
+            pedidos INTEGER NOT NULL DEFAULT 0,
+            valor_total REAL NOT NULL DEFAULT 0,
+            dias_com_compra INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (parceiro, filial)
+        )
+    """)
+    # Agregados sem filial (bancos anteriores à migração 15) são refeitos e preenchem a dimensão lá
+    if _rollup_por_filial(conn, 'parceiro'):
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_rollup_parceiro_cliente ON rollup_parceiro (parceiro, dia)")
+        _atualizar_clientes(conn)
+
+def _migracao_11(conn):
+    # Devolução classificada na ingestão (ver classificar_devolucoes), com valor e
+    # quantidade sempre negativos. O índice parcial cobre só as linhas de devolução e
+    # já traz as colunas do dashboard, sem ler a tabela.
+    if 'devolucao' not in _colunas(conn, 'vendas'):
+        conn.execute("ALTER TABLE vendas ADD COLUMN devolucao INTEGER NOT NULL DEFAULT 0")
+    termos = ' OR '.join(f"upper(operacao) LIKE '%{t}%'" for t in TERMOS_DEVOLUCAO)
+    conn.execute(f"UPDATE vendas SET devolucao = 1 WHERE quantidade < 0 OR valor < 0 OR {termos}")
+    # Bancos que passaram pela migração 3 já com esta coluna a criaram sem padrão
+    conn.execute("UPDATE vendas SET devolucao = 0 WHERE devolucao IS NULL")
+    # Os gatilhos registram os dias alterados; os agregados passam a somar valores líquidos
+    conn.execute("""
+        UPDATE vendas SET valor = -abs(valor), quantidade = -abs(quantidade)
+        WHERE devolucao = 1 AND (valor > 0 OR quantidade > 0)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_vendas_devolucao
+        ON vendas (data_competencia, parceiro, valor) WHERE devolucao = 1
+    """)
+    _atualizar_rollups(conn)
+
+def _migracao_12(conn):
+    # Agregados criados depois da migração 4 (ex.: transportadora): cria e preenche só os que faltam
+    for nome in ROLLUPS:
+        if _tabela_existe(conn, f"rollup_{nome}"):
+            continue
+        _criar_rollup(conn, nome)
+        dias = [linha[0] for linha in conn.execute(
+            "SELECT DISTINCT data_competencia FROM vendas WHERE data_competencia IS NOT NULL"
+        )]
+        for lote in _em_lotes(dias, 500):
+            _recalcular_rollup(conn, nome, lote)
+
+def _migracao_13(conn):
+    # Meses fechados movidos de vendas para arquivos Parquet (ver arquivo_vendas.py).
+    # Os agregados e a dimensão clientes desses meses continuam no banco.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS particoes_arquivadas (
+            mes TEXT PRIMARY KEY,
+            arquivo TEXT NOT NULL,
+            linhas INTEGER NOT NULL,
+            valor REAL NOT NULL,
+            bytes INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            arquivado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def _migracao_14(conn):
+    # Metas mensais de faturamento, cadastradas pelo admin
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS metas (
+            mes TEXT PRIMARY KEY,
+            valor REAL NOT NULL
+        )
+    """)
+
+def _origens_vendas(conn):
+    # Todo o histórico de vendas para reconstruir derivados (agregados, esboços): gera a
+    # própria tabela vendas e depois cada mês arquivado, carregado um de cada vez numa
+    # tabela temporária vendas_arquivo com as mesmas colunas. Gera (tabela, dias com vendas).
+    colunas = ['id'] + list(COLUNAS_VENDAS)
+    meses = conn.execute("SELECT mes, arquivo FROM particoes_arquivadas ORDER BY mes").fetchall()
+    for origem, arquivo in [('vendas', None)] + [('vendas_arquivo', arquivo) for _, arquivo in meses]:
+        if arquivo is not None:
+            df = ler_particao(arquivo)
+            conn.execute(f"CREATE TEMP TABLE vendas_arquivo AS SELECT {', '.join(colunas)} FROM vendas WHERE 0")
+            conn.executemany(
+                f"INSERT INTO vendas_arquivo VALUES ({', '.join('?' for _ in colunas)})",
+                zip(*(_para_sql(df[coluna]) for coluna in colunas))
+            )
+        dias = [linha[0] for linha in conn.execute(
+            f"SELECT DISTINCT data_competencia FROM {origem} WHERE data_competencia IS NOT NULL"
+        )]
+        try:
+            yield origem, dias
+        finally:
+            if arquivo is not None:
+                conn.execute("DROP TABLE vendas_arquivo")
+
+def _migracao_15(conn):
+    # Agregados e dimensão clientes passam a ser por filial: as tabelas antigas são
+    # refeitas a partir de vendas e, para os meses arquivados, dos arquivos Parquet
+    refazer = [nome for nome in ROLLUPS if not _rollup_por_filial(conn, nome)]
+    for nome in refazer:
+        conn.execute(f"DROP TABLE IF EXISTS rollup_{nome}")
+        _criar_rollup(conn, nome)
+    for origem, dias in _origens_vendas(conn) if refazer else []:
+        for nome in refazer:
+            for lote in _em_lotes(dias, 500):
+                _recalcular_rollup(conn, nome, lote, origem)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_rollup_parceiro_cliente ON rollup_parceiro (parceiro, dia)")
+    if 'filial' not in _colunas(conn, 'clientes'):
+        conn.execute("DROP TABLE clientes")
+        _migracao_10(conn)
+    else:
+        _atualizar_clientes(conn)
+
+def _migracao_16(conn):
+    # Esboços HyperLogLog diários (ver hll_utils) de vendas e clientes distintos, por
+    # filial, para o modo aproximado; preenchidos com todo o histórico, inclusive arquivado
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS esbocos_dia (
+            dia TEXT NOT NULL,
+            filial TEXT NOT NULL DEFAULT '',
+            vendas BLOB NOT NULL,
+            clientes BLOB NOT NULL,
+            PRIMARY KEY (dia, filial)
+        )
+    """)
+    for origem, dias in _origens_vendas(conn):
+        for lote in _em_lotes(dias, 500):
+            _recalcular_esbocos(conn, lote, origem)
+
+def _migracao_17(conn):
+    # O cancelamento de uma venda traz o mesmo Nº Venda e Código da original: com a chave
+    # só nesses dois campos ele substituía a venda (líquido -X em vez de 0). O tipo da
+    # linha entra na chave e as duas ficam gravadas. Vendas já substituídas não voltam.
+    conn.execute("DROP INDEX IF EXISTS ux_vendas_chave")
+    conn.execute(f"CREATE UNIQUE INDEX ux_vendas_chave ON vendas ({', '.join(CHAVE_VENDA)})")
+
+def _migracao_18(conn):
+    # Usuários restritos a filiais filtram por filial: sem ela na frente, o SQLite preferia
+    # ix_vendas_filial e lia todas as linhas da filial. Mesmo índice parcial de devoluções
+    # da migração 11, com a filial como primeira coluna.
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_vendas_devolucao_filial
+        ON vendas (filial, data_competencia, parceiro, valor) WHERE devolucao = 1
+    """)
+
+MIGRACOES = [
+    _migracao_1, _migracao_2, _migracao_3, _migracao_4, _migracao_5, _migracao_6, _migracao_7,
+    _migracao_8, _migracao_9, _migracao_10, _migracao_11, _migracao_12, _migracao_13, _migracao_14,
+    _migracao_15, _migracao_16, _migracao_17, _migracao_18,
+]
+
+_bancos_inicializados = set()
+
+def init_db():
+    # Roda as migrações pendentes uma vez por processo e por arquivo de banco;
+    # as chamadas seguintes (ex.: a cada rerun do Streamlit) não abrem o banco
+    if str(DB_FILE) in _bancos_inicializados:
+        return
+    with conexao_escrita() as conn:
+        if str(DB_FILE) in _bancos_inicializados:
+            return
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        for numero, migracao in enumerate(MIGRACOES[versao:], start=versao + 1):
+            # Cada migração roda em sua própria transação, junto com a troca de versão
+            conn.execute("BEGIN")
+            try:
+                migracao(conn)
+                conn.execute(f"PRAGMA user_version = {numero}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        _bancos_inicializados.add(str(DB_FILE))
+
+def versao_schema():
+    with conexao_leitura() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def versao_dados():
+    with conexao_leitura() as conn:
+        linha = conn.execute("SELECT valor FROM controle WHERE chave = 'versao_dados'").fetchone()
+    return linha[0] if linha else 0
+
+def token_dados():
+    # Chave de versão usada pelo cache: inclui o arquivo para não misturar bancos diferentes
+    return str(DB_FILE), versao_dados()
+
+def _incrementar_versao_dados(conn):
+    conn.execute("UPDATE controle SET valor = valor + 1 WHERE chave = 'versao_dados'")
+
+# ===================== Ingestão =====================
+
+def _clientes_dos_dias(conn, dias):
+    clientes = set()
+    for lote in _em_lotes(dias, 500):
+        clientes.update(linha[0] for linha in conn.execute(
+            f"SELECT DISTINCT parceiro FROM rollup_parceiro WHERE dia IN ({', '.join('?' for _ in lote)})", lote
+        ))
+    return clientes
+
+def _atualizar_clientes(conn, parceiros=None):
+    # Recalcula a dimensão clientes a partir de rollup_parceiro (índice por parceiro),
+    # só para os parceiros informados ou para todos. Sem vendas restantes, o cliente sai.
+    if parceiros is None:
+        conn.execute("DELETE FROM clientes")
+        lotes = [None]
+    else:
+        lotes = _em_lotes(sorted(p for p in parceiros if p != ''), 500)
+    for lote in lotes:
+        filtro, parametros = "parceiro <> ''", []
+        if lote is not None:
+            marcadores = ', '.join('?' for _ in lote)
+            conn.execute(f"DELETE FROM clientes WHERE parceiro IN ({marcadores})", lote)
+            filtro += f" AND parceiro IN ({marcadores})"
+            parametros = lote
+        conn.execute(f"""
+            INSERT INTO clientes (parceiro, filial, primeira_compra, ultima_compra, pedidos, valor_total, dias_com_compra)
+            SELECT parceiro, filial, MIN(dia), MAX(dia), SUM(vendas), SUM(valor), COUNT(*)
+            FROM rollup_parceiro
+            WHERE {filtro}
+            GROUP BY parceiro, filial
+        """, parametros)
+
+def _recalcular_rollup(conn, nome, dias, origem='vendas'):
+    # Refaz as linhas de rollup_<nome> dos dias informados a partir de vendas
+    # (ou de outra tabela com as mesmas colunas, ex.: um mês arquivado carregado em memória)
+    dimensoes = _dimensoes_rollup(nome)
+    marcadores = ', '.join('?' for _ in dias)
+    colunas_dim = ''.join(f"{d}, " for d in dimensoes)
+    valores_dim = ''.join(f"COALESCE({d}, ''), " for d in dimensoes)
+    conn.execute(f"DELETE FROM rollup_{nome} WHERE dia IN ({marcadores})", dias)
+    conn.execute(f"""
+        INSERT INTO rollup_{nome} (dia, {colunas_dim}valor, quantidade, linhas, vendas, clientes)
+        SELECT data_competencia, {valores_dim}
+               COALESCE(SUM(valor), 0), COALESCE(SUM(quantidade), 0), COUNT(*),
+               COUNT(DISTINCT numero_venda), COUNT(DISTINCT parceiro)
+        FROM {origem}
+        WHERE data_competencia IN ({marcadores})
+        GROUP BY data_competencia{''.join(f", COALESCE({d}, '')" for d in dimensoes)}
+    """, dias)
+
+def _recalcular_esbocos(conn, dias, origem='vendas'):
+    # Refaz os esboços de esbocos_dia dos dias informados, como _recalcular_rollup.
+    # Poucos dias por vez: cada (dia, filial) ocupa 2 × 4 KB enquanto os esboços são montados.
+    for parte in _em_lotes(dias, DIAS_POR_LOTE_ESBOCOS):
+        _recalcular_esbocos_dias(conn, parte, origem)
+
+def _recalcular_esbocos_dias(conn, dias, origem):
+    marcadores = ', '.join('?' for _ in dias)
+    conn.execute(f"DELETE FROM esbocos_dia WHERE dia IN ({marcadores})", dias)
+    df = pd.read_sql_query(f"""
+        SELECT data_competencia AS dia, COALESCE(filial, '') AS filial, numero_venda, parceiro
+        FROM {origem}
+        WHERE data_competencia IN ({marcadores})
+    """, conn, params=dias)
+    codigos, grupos = pd.MultiIndex.from_frame(df[['dia', 'filial']]).factorize()
+    vendas = hll_utils.esbocos(codigos, df['numero_venda'], len(grupos))
+    clientes = hll_utils.esbocos(codigos, df['parceiro'], len(grupos))
+    conn.executemany(
+        "INSERT INTO esbocos_dia (dia, filial, vendas, clientes) VALUES (?, ?, ?, ?)",
+        [
+            (dia, filial, hll_utils.para_bytes(vendas[i]), hll_utils.para_bytes(clientes[i]))
+            for i, (dia, filial) in enumerate(grupos)
+        ]
+    )
+
+def _atualizar_rollups(conn):
+    # Recalcula os agregados e os esboços apenas dos dias registrados em dias_pendentes,
+    # e a dimensão clientes dos parceiros que tinham ou passaram a ter vendas nesses dias.
+    # Deve rodar dentro da mesma transação que alterou vendas.
+    dias = [linha[0] for linha in conn.execute("SELECT dia FROM dias_pendentes")]
+    # Agregados ainda não criados ou sem filial (migrações 12 e 15 pendentes) são
+    # preenchidos por elas; o mesmo vale para a dimensão clientes (migrações 10 e 15)
+    rollups = [nome for nome in ROLLUPS if _rollup_por_filial(conn, nome)]
+    com_clientes = 'parceiro' in rollups and 'filial' in _colunas(conn, 'clientes')
+    afetados = _clientes_dos_dias(conn, dias) if com_clientes else set()
+    # Esboços só depois da migração 16, que preenche o histórico
+    com_esbocos = _tabela_existe(conn, 'esbocos_dia')
+    for lote in _em_lotes(dias, 500):
+        for nome in rollups:
+            _recalcular_rollup(conn, nome, lote)
+        if com_esbocos:
+            _recalcular_esbocos(conn, lote)
+    if com_clientes and dias:
+        _atualizar_clientes(conn, afetados | _clientes_dos_dias(conn, dias))
+    conn.execute("DELETE FROM dias_pendentes")
+    return len(dias)
+
+def hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+def hash_arquivo_em_disco(caminho, tamanho_bloco=1024 * 1024):
+    # Mesmo resultado de hash_conteudo, lendo o arquivo aos poucos
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+def arquivo_ja_ingerido(hash_arquivo):
+    with conexao_leitura() as conn:
+        linha = conn.execute("SELECT 1 FROM ingestoes WHERE hash = ?", (hash_arquivo,)).fetchone()
+    return linha is not None
+
+def _coluna_texto(df, coluna):
+    if coluna not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[coluna].fillna('').astype(str).str.strip()
+
+def _coluna_valor(df, coluna, padrao=0.0):
+    # Aceita "1.234,56", "1234,56" e "1234.56" numa única passada vetorizada
+    if coluna not in df.columns:
+        return pd.Series(padrao, index=df.index, dtype=float)
+    if pd.api.types.is_numeric_dtype(df[coluna]):
+        return df[coluna].astype(float)
+    texto = df[coluna].astype(str).str.strip()
+    com_virgula = texto.str.contains(',', regex=False)
+    convertido = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    texto = texto.where(~com_virgula, convertido)
+    return pd.to_numeric(texto, errors='coerce')
+
+def _coluna_data(df, coluna):
+    # Converte DD/MM/AAAA (formato do CSV) ou AAAA-MM-DD para texto ISO
+    if coluna not in df.columns:
+        return pd.Series(None, index=df.index, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(df[coluna]):
+        datas = df[coluna]
+    else:
+        texto = df[coluna].astype(str).str.strip().str.slice(0, 10)
+        datas = pd.to_datetime(texto, format='%d/%m/%Y', errors='coerce')
+        sem_data = datas.isna()
+        if sem_data.any():
+            datas = datas.where(~sem_data, pd.to_datetime(texto[sem_data], format='%Y-%m-%d', errors='coerce'))
+    return datas.dt.strftime('%Y-%m-%d')
+
+def _para_sql(serie):
+    # Valores ausentes viram NULL
+    return serie.astype(object).where(serie.notna(), None).tolist()
+
+def classificar_devolucoes(preparado):
+    # Devolução/cancelamento: quantidade ou valor negativos, ou operação com um de TERMOS_DEVOLUCAO.
+    # Essas linhas passam a ter valor e quantidade negativos, para os totais saírem líquidos.
+    operacao = preparado['operacao'].str.upper()
+    devolucao = (preparado['quantidade'].fillna(0) < 0) | (preparado['valor'].fillna(0) < 0)
+    for termo in TERMOS_DEVOLUCAO:
+        devolucao |= operacao.str.contains(termo, regex=False)
+    preparado['devolucao'] = devolucao.astype(int)
+    preparado['valor'] = preparado['valor'].abs().where(~devolucao, -preparado['valor'].abs())
+    preparado['quantidade'] = preparado['quantidade'].abs().where(~devolucao, -preparado['quantidade'].abs())
+    return preparado
+
+def preparar_vendas(df):
+    # Converte as colunas de uma vez e separa as linhas inválidas
+    quantidade = _coluna_valor(df, 'quantidade', padrao=float('nan')).round().astype('Int64')
+    preparado = pd.DataFrame({
+        coluna: _coluna_texto(df, coluna)
+        for coluna, tipo in COLUNAS_VENDAS.items() if tipo == 'TEXT'
+    }, index=df.index)
+    preparado['data_competencia'] = _coluna_data(df, 'data_competencia')
+    preparado['valor'] = _coluna_valor(df, 'valor')
+    preparado['quantidade'] = quantidade
+    classificar_devolucoes(preparado)
+    motivo = pd.Series('', index=df.index, dtype=object)
+    motivo[preparado['data_competencia'].isna()] = 'data inválida'
+    motivo[preparado['valor'].isna()] = 'valor inválido'
+    # Sem número da venda não há chave natural para o upsert
+    motivo[preparado['numero_venda'] == ''] = 'número da venda ausente'
+    invalidas = motivo != ''
+    rejeitados = df[invalidas].copy()
+    rejeitados['motivo'] = motivo[invalidas]
+    return preparado.loc[~invalidas, list(COLUNAS_VENDAS)], rejeitados
+
+def _em_lotes(registros, tamanho):
+    for inicio in range(0, len(registros), tamanho):
+        yield registros[inicio:inicio + tamanho]
+
+# Linha cuja chave (CHAVE_VENDA) já apareceu antes no mesmo arquivo: vale a primeira
+MOTIVO_CHAVE_REPETIDA = 'venda e produto repetidos no arquivo'
+
+def _separar_chaves_repetidas(validas, vistas):
+    # vistas é o vetor ordenado dos hashes das chaves já gravadas deste arquivo.
+    # Retorna (validas sem as repetidas, repetidas, vistas atualizado).
+    chaves = pd.util.hash_pandas_object(validas[list(CHAVE_VENDA)], index=False).to_numpy()
+    posicoes = np.searchsorted(vistas, chaves)
+    ja_vistas = np.zeros(len(chaves), dtype=bool)
+    dentro = posicoes < len(vistas)
+    ja_vistas[dentro] = vistas[posicoes[dentro]] == chaves[dentro]
+    repetidas = ja_vistas | pd.Series(chaves).duplicated().to_numpy()
+    novas = np.sort(chaves[~repetidas])
+    vistas = np.insert(vistas, np.searchsorted(vistas, novas), novas)
+    return validas[~repetidas], validas[repetidas], vistas
+
+def _sql_upsert_vendas():
+    colunas = list(COLUNAS_VENDAS)
+    atualizacoes = ',\n            '.join(f"{c} = excluded.{c}" for c in colunas if c not in CHAVE_VENDA)
+    return f"""
+        INSERT INTO vendas ({', '.join(colunas)})
+        VALUES ({', '.join('?' for _ in colunas)})
+        ON CONFLICT ({', '.join(CHAVE_VENDA)}) DO UPDATE SET
+            {atualizacoes}
+    """
+
+@cronometrado()
+def ingerir_blocos(blocos, hash_arquivo=None, nome_arquivo=None, tamanho_lote=TAMANHO_LOTE,
+                   progresso=None, tamanho_bytes=None, ja_preparados=False):
+    # Grava uma sequência de DataFrames padronizados (ver COLUNAS_VENDAS) numa única transação.
+    # Cada bloco é convertido e gravado antes de o próximo ser lido, então a memória usada
+    # depende do tamanho do bloco e não do arquivo. Linhas com a mesma chave
+    # (CHAVE_VENDA) substituem as existentes no banco; dentro do mesmo arquivo vale a
+    # primeira e as seguintes são rejeitadas (MOTIVO_CHAVE_REPETIDA).
+    # progresso, se informado, recebe o total de linhas gravadas após cada lote.
+    # Com ja_preparados, cada bloco é o par (validas, rejeitados) de preparar_vendas,
+    # convertido antes em outro processo.
+    # Retorna um resumo com inseridos (linhas gravadas, novas ou substituindo existentes),
+    # atualizados (quantas dessas substituíram linhas existentes), rejeitados (DataFrame com a coluna "motivo", limitado a
+    # LIMITE_REJEITADOS linhas; total_rejeitados traz a contagem completa), a vazão e se o
+    # arquivo já havia sido importado
+    inicio = time.perf_counter()
+    sql = _sql_upsert_vendas()
+    duplicado = False
+    lidas = gravados = total_rejeitados = novos = 0
+    amostra_rejeitados = []
+    vistas = np.array([], dtype=np.uint64)
+    with conexao_escrita() as conn:
+        # Uma única transação: ou entram todas as linhas válidas ou nenhuma
+        with conn:
+            if hash_arquivo is not None:
+                duplicado = conn.execute(
+                    "SELECT 1 FROM ingestoes WHERE hash = ?", (hash_arquivo,)
+                ).fetchone() is not None
+            if not duplicado:
+                antes = conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0]
+                arquivados = _meses_arquivados(conn)
+                for bloco in blocos:
+                    validas, rejeitados = bloco if ja_preparados else preparar_vendas(bloco)
+                    if arquivados:
+                        # O arquivo de um mês fechado não é regravado: linhas desses meses são recusadas
+                        em_arquivo = validas['data_competencia'].str.slice(0, 7).isin(arquivados)
+                        if em_arquivo.any():
+                            rejeitados = pd.concat([rejeitados, validas[em_arquivo].assign(motivo='mês arquivado')])
+                            validas = validas[~em_arquivo]
+                    validas, repetidas, vistas = _separar_chaves_repetidas(validas, vistas)
+                    if not repetidas.empty:
+                        rejeitados = pd.concat([rejeitados, repetidas.assign(motivo=MOTIVO_CHAVE_REPETIDA)])
+                    lidas += len(validas) + len(rejeitados)
+                    total_rejeitados += len(rejeitados)
+                    vagas = LIMITE_REJEITADOS - sum(len(r) for r in amostra_rejeitados)
+                    if vagas > 0 and not rejeitados.empty:
+                        amostra_rejeitados.append(rejeitados.head(vagas))
+                    registros = list(zip(*(_para_sql(validas[coluna]) for coluna in COLUNAS_VENDAS)))
+                    for lote in _em_lotes(registros, tamanho_lote):
+                        gravados += conn.executemany(sql, lote).rowcount
+                        if progresso is not None:
+                            progresso(gravados)
+                novos = conn.execute("SELECT COUNT(*) FROM vendas").fetchone()[0] - antes
+                _atualizar_rollups(conn)
+                _incrementar_versao_dados(conn)
+                if hash_arquivo is not None:
+                    conn.execute(
+                        "INSERT INTO ingestoes (hash, nome_arquivo, linhas) VALUES (?, ?, ?)",
+                        (hash_arquivo, nome_arquivo, gravados)
+                    )
+    segundos = time.perf_counter() - inicio
+    return {
+        'inseridos': gravados,
+        'atualizados': gravados - novos,
+        'rejeitados': pd.concat(amostra_rejeitados) if amostra_rejeitados else pd.DataFrame(columns=['motivo']),
+        'total_rejeitados': total_rejeitados,
+        'duplicado': duplicado,
+        'linhas_lidas': lidas,
+        'bytes': tamanho_bytes,
+        'segundos': segundos,
+        'linhas_por_segundo': lidas / segundos if segundos > 0 else 0.0,
+        'bytes_por_segundo': tamanho_bytes / segundos if tamanho_bytes and segundos > 0 else None,
+    }
+
+def insert_sales_from_csv(df, hash_arquivo=None, nome_arquivo=None, tamanho_lote=TAMANHO_LOTE, progresso=None):
+    # Versão para um DataFrame já carregado em memória; ver ingerir_blocos
+    return ingerir_blocos([df], hash_arquivo=hash_arquivo, nome_arquivo=nome_arquivo,
+                          tamanho_lote=tamanho_lote, progresso=progresso)
+
+# ===================== Jobs de ingestão =====================
+
+def criar_job_ingestao(hash_arquivo, nome_arquivo, caminho):
+    with conexao_escrita() as conn:
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs_ingestao (hash, nome_arquivo, caminho) VALUES (?, ?, ?)",
+                (hash_arquivo, nome_arquivo, str(caminho))
+            )
+    return cursor.lastrowid
+
+def atualizar_job_ingestao(job_id, **campos):
+    permitidos = {
+        'status', 'linhas_processadas', 'inseridos', 'rejeitados', 'caminho_rejeitados',
+        'erro', 'iniciado_em', 'finalizado_em', 'bytes', 'segundos',
+    }
+    atribuicoes = ', '.join(f"{_validar_coluna(c, permitidos)} = ?" for c in campos)
+    with conexao_escrita() as conn:
+        with conn:
+            conn.execute(f"UPDATE jobs_ingestao SET {atribuicoes} WHERE id = ?", (*campos.values(), job_id))
+
+def ultimo_job_para_hash(hash_arquivo):
+    # (id, status) do job mais recente para o mesmo conteúdo, se houver
+    with conexao_leitura() as conn:
+        return conn.execute(
+            "SELECT id, status FROM jobs_ingestao WHERE hash = ? ORDER BY id DESC LIMIT 1",
+            (hash_arquivo,)
+        ).fetchone()
+
+def listar_jobs_ingestao(limite=10, status=None):
+    sql = "SELECT * FROM jobs_ingestao"
+    parametros = []
+    if status is not None:
+        condicoes = []
+        _filtro_valores('status', status, condicoes, parametros)
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += " ORDER BY id DESC"
+    if limite is not None:
+        sql += " LIMIT ?"
+        parametros.append(limite)
+    with conexao_leitura() as conn:
+        return pd.read_sql_query(sql, conn, params=parametros)
+
+# ===================== Meses arquivados =====================
+# Meses fechados saem de vendas para um Parquet por mês (ver arquivo_vendas.py). As
+# leituras que tocam esses meses montam uma visão vendas = banco + arquivos do período.
+
+def _meses_arquivados(conn):
+    return {linha[0] for linha in conn.execute("SELECT mes FROM particoes_arquivadas")}
+
+def diretorio_arquivo():
+    # Arquivos ficam ao lado do banco, para cada banco ter os seus
+    return Path(DB_FILE).parent / "arquivo"
+
+@em_cache(token_dados)
+def particoes_arquivadas():
+    with conexao_leitura() as conn:
+        return pd.read_sql_query("SELECT * FROM particoes_arquivadas ORDER BY mes", conn)
+
+def _meses_no_periodo(particoes, inicio, fim):
+    # Partições que podem ter linhas em [inicio, fim]; as demais nem são abertas
+    meses = particoes['mes']
+    if inicio is not None:
+        meses = meses[meses >= _data_iso(inicio)[:7]]
+    if fim is not None:
+        meses = meses[meses <= _data_iso(fim)[:7]]
+    return particoes[particoes['mes'].isin(meses)]
+
+def ler_particao(arquivo, inicio=None, fim=None):
+    # Lê um Parquet de mês arquivado, só com as linhas do período
+    filtros = []
+    if inicio is not None:
+        filtros.append(('data_competencia', '>=', _data_iso(inicio)))
+    if fim is not None:
+        filtros.append(('data_competencia', '<=', _data_iso(fim)))
+    return pd.read_parquet(diretorio_arquivo() / arquivo, engine='pyarrow', filters=filtros or None)
+
+@contextmanager
+def conexao_vendas(inicio=None, fim=None):
+    # Conexão para consultas sobre vendas. Sem meses arquivados no período é a conexão
+    # de leitura do pool; com eles, uma conexão em memória com o banco anexado somente
+    # leitura e uma visão temporária "vendas" que junta a tabela e as linhas arquivadas,
+    # para o mesmo SQL rodar sem alteração (os filtros descem para os dois lados da união)
+    particoes = _meses_no_periodo(particoes_arquivadas(), inicio, fim)
+    if particoes.empty:
+        with conexao_leitura() as conn:
+            yield conn
+        return
+    conn = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+    try:
+        conn.execute("ATTACH DATABASE ? AS quente", (f"file:{Path(DB_FILE).resolve()}?mode=ro",))
+        colunas = ['id'] + list(COLUNAS_VENDAS)
+        conn.execute(f"CREATE TEMP TABLE vendas_arquivo AS SELECT {', '.join(colunas)} FROM quente.vendas WHERE 0")
+        inserir = f"INSERT INTO vendas_arquivo VALUES ({', '.join('?' for _ in colunas)})"
+        for arquivo in particoes['arquivo']:
+            df = ler_particao(arquivo, inicio, fim)
+            conn.executemany(inserir, zip(*(_para_sql(df[coluna]) for coluna in colunas)))
+        conn.execute(f"""
+            CREATE TEMP VIEW vendas AS
+            SELECT {', '.join(colunas)} FROM quente.vendas
+            UNION ALL
+            SELECT {', '.join(colunas)} FROM vendas_arquivo
+        """)
+        yield conn
+    finally:
+        conn.close()
+
+# ===================== Leitura =====================
+
+# Expressões de agrupamento aceitas por consultar_vendas além das próprias colunas
+DIMENSOES_DERIVADAS = {
+    'mes': "substr(data_competencia, 1, 7)",
+    'ano': "substr(data_competencia, 1, 4)",
+}
+# Funções de agregação aceitas: nome -> modelo SQL
+AGREGACOES = {
+    'sum': "COALESCE(SUM({}), 0)",
+    'avg': "AVG({})",
+    'min': "MIN({})",
+    'max': "MAX({})",
+    'count': "COUNT({})",
+    'count_distinct': "COUNT(DISTINCT {})",
+}
+
+# Tipos em memória dos DataFrames de vendas: dimensões repetitivas viram categóricas
+COLUNAS_CATEGORICAS = ('parceiro', 'vendedor', 'codigo_produto', 'filial', 'forma_pagamento', 'tipo_da_condicao')
+TIPOS_NUMERICOS = {'id': 'int64', 'valor': 'float64', 'quantidade': 'Int32', 'devolucao': 'int8'}
+
+def tipar_vendas(df):
+    # Converte uma única vez, na leitura: datas em datetime64, valores numéricos e
+    # dimensões categóricas. Colunas ausentes (projeções/agregações) são ignoradas.
+    if 'data_competencia' in df.columns:
+        df['data_competencia'] = pd.to_datetime(df['data_competencia'], format='%Y-%m-%d', errors='coerce')
+    for coluna, tipo in TIPOS_NUMERICOS.items():
+        if coluna in df.columns:
+            numeros = pd.to_numeric(df[coluna], errors='coerce')
+            # Um apelido de agregação (ex.: média de quantidade) pode não ser inteiro
+            if tipo != 'float64' and not (numeros.dropna() % 1 == 0).all():
+                tipo = 'float64'
+            df[coluna] = numeros.astype(tipo)
+    for coluna in COLUNAS_CATEGORICAS:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+def _validar_coluna(coluna, permitidas):
+    # Nomes de coluna não podem ir como parâmetro: só passam os da lista branca
+    if coluna not in permitidas:
+        raise ValueError(f"Coluna não permitida: {coluna}")
+    return coluna
+
+def _data_iso(data):
+    return pd.Timestamp(data).strftime('%Y-%m-%d')
+
+def _filtro_periodo(coluna, inicio, fim, condicoes, parametros):
+    if inicio is not None:
+        condicoes.append(f"{coluna} >= ?")
+        parametros.append(_data_iso(inicio))
+    if fim is not None:
+        condicoes.append(f"{coluna} <= ?")
+        parametros.append(_data_iso(fim))
+
+def _filtro_valores(coluna, valores, condicoes, parametros):
+    # Aceita um valor único ou uma lista (vira IN)
+    if valores is None:
+        return
+    if isinstance(valores, str) or not hasattr(valores, '__iter__'):
+        valores = [valores]
+    valores = list(valores)
+    condicoes.append(f"{coluna} IN ({', '.join('?' for _ in valores)})" if valores else "0")
+    parametros.extend(valores)
+
+def montar_consulta_vendas(colunas=None, inicio=None, fim=None, parceiro=None, vendedor=None,
+                           filial=None, devolucao=None, agrupar_por=None, agregacoes=None, ordenar_por=None,
+                           limite=None, filiais=None):
+    # Compila a consulta em SQL parametrizado. agregacoes é um dict
+    # {apelido: (funcao, coluna)}, com funcao em AGREGACOES; coluna "*" só vale para count.
+    # filiais é a restrição de acesso do usuário (None = todas), somada ao filtro filial.
+    # Retorna (sql, parametros).
+    permitidas = ['id'] + list(COLUNAS_VENDAS)
+    condicoes, parametros = [], []
+    _filtro_periodo('data_competencia', inicio, fim, condicoes, parametros)
+    _filtro_valores('parceiro', parceiro, condicoes, parametros)
+    _filtro_valores('vendedor', vendedor, condicoes, parametros)
+    _filtro_valores('filial', filial, condicoes, parametros)
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    if devolucao is not None:
+        # Literal e não parâmetro: só assim o SQLite usa os índices parciais de devolução
+        condicoes.append(f"devolucao = {1 if devolucao else 0}")
+    if agrupar_por or agregacoes:
+        grupos = [agrupar_por] if isinstance(agrupar_por, str) else list(agrupar_por or [])
+        selecao = []
+        for grupo in grupos:
+            if grupo in DIMENSOES_DERIVADAS:
+                selecao.append(f"{DIMENSOES_DERIVADAS[grupo]} AS {grupo}")
+            else:
+                selecao.append(_validar_coluna(grupo, permitidas))
+        for apelido, (funcao, coluna) in (agregacoes or {'valor': ('sum', 'valor')}).items():
+            if funcao not in AGREGACOES or not apelido.isidentifier():
+                raise ValueError(f"Agregação inválida: {apelido}={funcao}")
+            if not (coluna == '*' and funcao == 'count'):
+                _validar_coluna(coluna, permitidas)
+            selecao.append(f"{AGREGACOES[funcao].format(coluna)} AS {apelido}")
+        ordenaveis = grupos + list(agregacoes or {'valor': None})
+    else:
+        selecao = [_validar_coluna(c, permitidas) for c in (colunas or permitidas)]
+        grupos = []
+        ordenaveis = permitidas
+    sql = f"SELECT {', '.join(selecao)} FROM vendas"
+    if devolucao and any(c.startswith('filial IN') for c in condicoes):
+        # Sem estatísticas (ANALYZE) o SQLite pode preferir ix_vendas_filial, que lê todas
+        # as linhas da filial; o índice parcial já cobre filial, período e valores
+        sql += " INDEXED BY ix_vendas_devolucao_filial"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    if grupos:
+        sql += " GROUP BY " + ", ".join(grupos)
+    if ordenar_por:
+        # "-coluna" ordena de forma decrescente
+        termos = [ordenar_por] if isinstance(ordenar_por, str) else list(ordenar_por)
+        sql += " ORDER BY " + ", ".join(
+            f"{_validar_coluna(t.lstrip('-'), ordenaveis)} {'DESC' if t.startswith('-') else 'ASC'}"
+            for t in termos
+        )
+    if limite is not None:
+        sql += " LIMIT ?"
+        parametros.append(int(limite))
+    return sql, parametros
+
+@em_cache(token_dados)
+@cronometrado('sql:consultar_vendas')
+def consultar_vendas(**filtros):
+    # Busca só as linhas e colunas pedidas, já tipadas (ver tipar_vendas);
+    # ver montar_consulta_vendas para os argumentos
+    sql, parametros = montar_consulta_vendas(**filtros)
+    with conexao_vendas(filtros.get('inicio'), filtros.get('fim')) as conn:
+        df = pd.read_sql_query(sql, conn, params=parametros)
+    return tipar_vendas(df)
+
+@cronometrado()
+def get_sales(limite=None):
+    # Mantida por compatibilidade: todas as colunas, sem filtros
+    return consultar_vendas(limite=limite)
+
+# Tabela paginada: colunas que podem ordenar (todas têm índice, e o índice termina no id)
+# e colunas que aceitam filtro por lista de valores
+ORDENACOES_PAGINA = ('data_competencia', 'valor')
+FILTROS_PAGINA = ('vendedor', 'filial', 'forma_pagamento', 'tipo_da_condicao', 'numero_venda')
+
+def montar_pagina_vendas(colunas=None, inicio=None, fim=None, parceiro_prefixo=None, ordenar_por='data_competencia',
+                         decrescente=True, apos=None, tamanho=50, filiais=None, **filtros):
+    # Paginação por chave (keyset): apos é o par (valor da coluna de ordenação, id) da
+    # última linha da página anterior. Cada página é uma única consulta que percorre o
+    # índice a partir desse ponto, sem OFFSET, custando o mesmo em qualquer página.
+    # filiais restringe às filiais do usuário, como em montar_consulta_vendas.
+    # Retorna (sql, parametros); a consulta traz uma linha a mais para saber se há próxima página.
+    ordem = _validar_coluna(ordenar_por, ORDENACOES_PAGINA)
+    permitidas = ['id'] + list(COLUNAS_VENDAS)
+    selecao = [_validar_coluna(c, permitidas) for c in (colunas or permitidas)]
+    for extra in ('id', ordem):
+        if extra not in selecao:
+            selecao.append(extra)
+    condicoes, parametros = [], []
+    _filtro_periodo('data_competencia', inicio, fim, condicoes, parametros)
+    for coluna, valores in filtros.items():
+        _filtro_valores(_validar_coluna(coluna, FILTROS_PAGINA), valores, condicoes, parametros)
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    if parceiro_prefixo:
+        # Faixa [prefixo, prefixo + maior caractere): usa o índice de parceiro, ao contrário do LIKE
+        condicoes.append("parceiro >= ? AND parceiro < ?")
+        parametros.extend([parceiro_prefixo, parceiro_prefixo + '\U0010ffff'])
+    if apos is not None:
+        condicoes.append(f"({ordem}, id) {'<' if decrescente else '>'} (?, ?)")
+        parametros.extend(apos)
+    direcao = 'DESC' if decrescente else 'ASC'
+    sql = f"SELECT {', '.join(selecao)} FROM vendas"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    sql += f" ORDER BY {ordem} {direcao}, id {direcao} LIMIT ?"
+    parametros.append(int(tamanho) + 1)
+    return sql, parametros
+
+@em_cache(token_dados)
+@cronometrado('sql:pagina_vendas')
+def pagina_vendas(**argumentos):
+    # Uma página da tabela de vendas; ver montar_pagina_vendas para os argumentos.
+    # Retorna (DataFrame da página, cursor da próxima página ou None se for a última)
+    tamanho = int(argumentos.get('tamanho', 50))
+    sql, parametros = montar_pagina_vendas(**argumentos)
+    with conexao_vendas(argumentos.get('inicio'), argumentos.get('fim')) as conn:
+        df = pd.read_sql_query(sql, conn, params=parametros)
+    proxima = None
+    if len(df) > tamanho:
+        df = df.iloc[:tamanho]
+        ultima = df.iloc[-1]
+        ordem = argumentos.get('ordenar_por', 'data_competencia')
+        proxima = (ultima[ordem].item() if hasattr(ultima[ordem], 'item') else ultima[ordem], int(ultima['id']))
+    return tipar_vendas(df), proxima
+
+@em_cache(token_dados)
+def intervalo_datas(filiais=None):
+    # Primeiro e último dia com vendas (das filiais informadas), ou None se não houver
+    condicoes, parametros = [], []
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    sql = "SELECT MIN(dia), MAX(dia) FROM rollup_dia"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    with conexao_leitura() as conn:
+        inicio, fim = conn.execute(sql, parametros).fetchone()
+    if inicio is None:
+        return None
+    return pd.Timestamp(inicio).date(), pd.Timestamp(fim).date()
+
+@em_cache(token_dados)
+@cronometrado('sql:get_rollup')
+def get_rollup(nome, inicio=None, fim=None, filiais=None):
+    # Lê um dos agregados diários de ROLLUPS, opcionalmente restrito a [inicio, fim] e às
+    # filiais informadas, somando as filiais: uma linha por dia e dimensões.
+    # "clientes" soma os distintos de cada filial.
+    if nome not in ROLLUPS:
+        raise ValueError(f"Agregado desconhecido: {nome}")
+    condicoes, parametros = [], []
+    _filtro_periodo('dia', inicio, fim, condicoes, parametros)
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    grupos = ', '.join(('dia',) + ROLLUPS[nome])
+    sql = f"""
+        SELECT {grupos}, SUM(valor) AS valor, SUM(quantidade) AS quantidade, SUM(linhas) AS linhas,
+               SUM(vendas) AS vendas, SUM(clientes) AS clientes
+        FROM rollup_{nome}"""
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    with conexao_leitura() as conn:
+        df = pd.read_sql_query(f"{sql} GROUP BY {grupos} ORDER BY dia", conn, params=parametros, parse_dates=['dia'])
+    return df
+
+# Faixas de recência (dias desde a última compra até a data de referência): rótulo -> (mínimo, máximo)
+FAIXAS_RECENCIA = {
+    '0-30 dias': (0, 30),
+    '31-90 dias': (31, 90),
+    '91-180 dias': (91, 180),
+    '181-365 dias': (181, 365),
+    'Mais de 365 dias': (366, None),
+}
+
+def _sql_clientes(filiais):
+    # Dimensão consolidada por parceiro, somando as filiais informadas (ou todas).
+    # dias_com_compra soma os dias de cada filial. Retorna (sql, parametros).
+    condicoes, parametros = [], []
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    filtro = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return f"""
+        SELECT parceiro, MIN(primeira_compra) AS primeira_compra, MAX(ultima_compra) AS ultima_compra,
+               SUM(pedidos) AS pedidos, SUM(valor_total) AS valor_total, SUM(dias_com_compra) AS dias_com_compra
+        FROM clientes{filtro}
+        GROUP BY parceiro
+    """, parametros
+
+@em_cache(token_dados)
+@cronometrado('sql:novos_clientes_por_dia')
+def novos_clientes_por_dia(inicio=None, fim=None, filiais=None):
+    # Clientes cuja primeira compra (em todo o histórico das filiais) caiu em cada dia do período
+    consolidado, parametros = _sql_clientes(filiais)
+    condicoes = []
+    _filtro_periodo('primeira_compra', inicio, fim, condicoes, parametros)
+    sql = f"SELECT primeira_compra AS dia, COUNT(*) AS novos FROM ({consolidado})"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    with conexao_leitura() as conn:
+        df = pd.read_sql_query(sql + " GROUP BY primeira_compra ORDER BY dia", conn, params=parametros, parse_dates=['dia'])
+    return df.set_index('dia')['novos']
+
+@em_cache(token_dados)
+@cronometrado('sql:clientes_por_recencia')
+def clientes_por_recencia(referencia=None, filiais=None):
+    # Clientes e valor acumulado por faixa de recência (FAIXAS_RECENCIA), contando a
+    # partir de referencia ou, sem ela, do último dia com vendas das filiais
+    consolidado, parametros_consolidado = _sql_clientes(filiais)
+    with conexao_leitura() as conn:
+        if referencia is None:
+            referencia = conn.execute(
+                f"SELECT MAX(ultima_compra) FROM ({consolidado})", parametros_consolidado
+            ).fetchone()[0]
+        casos, parametros = [], []
+        for rotulo, (minimo, maximo) in FAIXAS_RECENCIA.items():
+            condicao = "recencia >= ?" + (" AND recencia <= ?" if maximo is not None else "")
+            casos.append(f"WHEN {condicao} THEN ?")
+            parametros.extend([minimo] + ([maximo] if maximo is not None else []) + [rotulo])
+        df = pd.read_sql_query(f"""
+            SELECT CASE {' '.join(casos)} END AS faixa, COUNT(*) AS clientes, COALESCE(SUM(valor_total), 0) AS valor
+            FROM (
+                SELECT valor_total, CAST(julianday(?) - julianday(ultima_compra) AS INTEGER) AS recencia
+                FROM ({consolidado})
+                WHERE ultima_compra <= ?
+            )
+            GROUP BY faixa
+        """, conn, params=(
+            parametros + [None if referencia is None else _data_iso(referencia)]
+            + parametros_consolidado + [None if referencia is None else _data_iso(referencia)]
+        ))
+    return df.set_index('faixa').reindex(list(FAIXAS_RECENCIA), fill_value=0)
+
+@em_cache(token_dados)
+@cronometrado('sql:ranking_clientes')
+def ranking_clientes(limite=10, ordenar_por='valor_total', filiais=None):
+    # Maiores clientes de todo o histórico, direto da dimensão
+    ordem = _validar_coluna(ordenar_por, ('valor_total', 'pedidos', 'ultima_compra'))
+    consolidado, parametros = _sql_clientes(filiais)
+    with conexao_leitura() as conn:
+        return pd.read_sql_query(
+            f"SELECT * FROM ({consolidado}) ORDER BY {ordem} DESC, parceiro LIMIT ?", conn,
+            params=parametros + [int(limite)], parse_dates=['primeira_compra', 'ultima_compra']
+        )
+
+@em_cache(token_dados)
+@cronometrado('sql:distintos_aproximados')
+def distintos_aproximados(inicio=None, fim=None, filiais=None):
+    # Vendas e clientes distintos no período pela união dos esboços diários, sem ler
+    # vendas nem rollup_parceiro. Erro de até ±hll_utils.LIMITE_ERRO_95 (≈3,3%) em 95%
+    # dos casos; ver hll_utils. Retorna {'vendas': n, 'clientes': n}.
+    condicoes, parametros = [], []
+    _filtro_periodo('dia', inicio, fim, condicoes, parametros)
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    sql = "SELECT vendas, clientes FROM esbocos_dia"
+    if condicoes:
+        sql += " WHERE " + " AND ".join(condicoes)
+    with conexao_leitura() as conn:
+        esbocos = conn.execute(sql, parametros).fetchall()
+    return {
+        medida: int(round(hll_utils.estimar(hll_utils.unir(hll_utils.de_bytes(linha[i]) for linha in esbocos))))
+        for i, medida in enumerate(('vendas', 'clientes'))
+    }
+
+@em_cache(token_dados)
+def filiais_disponiveis(filiais=None):
+    # Filiais com vendas (entre as informadas), em ordem
+    condicoes, parametros = ["filial <> ''"], []
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    with conexao_leitura() as conn:
+        return [linha[0] for linha in conn.execute(
+            f"SELECT DISTINCT filial FROM rollup_dia WHERE {' AND '.join(condicoes)} ORDER BY filial", parametros
+        )]
+
+# Ranking: dimensão -> agregado diário que a contém (as demais colunas de texto de vendas
+# caem na própria tabela, lendo só o período pelo índice de data). Todo agregado tem filial.
+DIMENSOES_RANKING = {dimensao: f"rollup_{nome}" for nome, dimensoes in ROLLUPS.items() for dimensao in dimensoes}
+DIMENSOES_RANKING['filial'] = 'rollup_dia'
+# Medida -> (expressão sobre um agregado diário, expressão sobre vendas)
+MEDIDAS_RANKING = {
+    'valor': ("SUM(valor)", "SUM(valor)"),
+    'quantidade': ("SUM(quantidade)", "SUM(quantidade)"),
+    'linhas': ("SUM(linhas)", "COUNT(*)"),
+    'vendas': ("SUM(vendas)", "COUNT(DISTINCT numero_venda)"),
+}
+ROTULO_OUTROS = 'Outros'
+
+def montar_ranking(dimensao, inicio=None, fim=None, limite=10, medida='valor', outros=True, ignorar_vazios=True,
+                   filiais=None):
+    # Top-N por soma, com RANK(): empates na última posição entram todos, então o
+    # resultado pode ter mais de "limite" itens. Com outros, uma última linha soma o
+    # restante (posicao NULL). filiais restringe às filiais do usuário. Retorna (sql, parametros).
+    if medida not in MEDIDAS_RANKING:
+        raise ValueError(f"Medida de ranking desconhecida: {medida}")
+    if dimensao in DIMENSOES_RANKING:
+        fonte, coluna_dia, expressao = DIMENSOES_RANKING[dimensao], 'dia', MEDIDAS_RANKING[medida][0]
+    else:
+        textos = [c for c, tipo in COLUNAS_VENDAS.items() if tipo == 'TEXT' and c != 'data_competencia']
+        fonte, coluna_dia, expressao = 'vendas', 'data_competencia', MEDIDAS_RANKING[medida][1]
+        _validar_coluna(dimensao, textos)
+    condicoes, parametros = [], []
+    _filtro_periodo(coluna_dia, inicio, fim, condicoes, parametros)
+    _filtro_valores('filial', filiais, condicoes, parametros)
+    if ignorar_vazios:
+        condicoes.append(f"{dimensao} <> ''")
+    filtro = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    sql = f"""
+        WITH totais AS (
+            SELECT {dimensao} AS item, COALESCE({expressao}, 0) AS total FROM {fonte}{filtro} GROUP BY {dimensao}
+        ), classificados AS (
+            SELECT item, total, RANK() OVER (ORDER BY total DESC) AS posicao FROM totais
+        )
+        SELECT * FROM (
+            SELECT item AS {dimensao}, total AS {medida}, posicao FROM classificados WHERE posicao <= ?"""
+    parametros.append(int(limite))
+    if outros:
+        sql += f"""
+            UNION ALL
+            SELECT ?, SUM(total), NULL FROM classificados WHERE posicao > ? HAVING COUNT(*) > 0"""
+        parametros.extend([ROTULO_OUTROS, int(limite)])
+    sql += f"""
+        ) ORDER BY posicao IS NULL, posicao, {dimensao}"""
+    return sql, parametros
+
+@em_cache(token_dados)
+@cronometrado('sql:ranking')
+def ranking(dimensao, inicio=None, fim=None, limite=10, medida='valor', outros=True, ignorar_vazios=True,
+            filiais=None):
+    # Maiores itens de uma dimensão no período; ver montar_ranking
+    sql, parametros = montar_ranking(dimensao, inicio, fim, limite, medida, outros, ignorar_vazios, filiais)
+    conexao = conexao_leitura() if dimensao in DIMENSOES_RANKING else conexao_vendas(inicio, fim)
+    with conexao as conn:
+        df = pd.read_sql_query(sql, conn, params=parametros)
+    df['posicao'] = df['posicao'].astype('Int64')
+    return df
+
+# ===================== Séries temporais =====================
+
+# Granularidade -> expressão SQL do início do período de um dia, passo do calendário e
+# quantos períodos voltar para comparar com o ano anterior (semana/dia: mesmo dia da semana)
+GRANULARIDADES = {
+    'dia': ("date({})", '+1 day', 364),
+    'semana': ("date({}, 'weekday 0', '-6 days')", '+7 days', 52),
+    'mes': ("date({}, 'start of month')", '+1 month', 12),
+}
+MEDIDAS_SERIE = ('valor', 'quantidade', 'linhas', 'vendas')
+COLUNAS_SERIE = [
+    'periodo', 'valor', 'anterior', 'ano_anterior', 'variacao_anterior', 'variacao_ano',
+    'acumulado', 'media_7d', 'media_30d', 'meta',
+]
+
+def montar_serie_temporal(granularidade, inicio, fim, medida='valor', filiais=None):
+    # Série sobre rollup_dia com um calendário sem buracos (períodos sem venda valem 0),
+    # para as funções de janela compararem períodos de fato vizinhos:
+    #   anterior / variacao_anterior: período anterior (MoM no mensal)
+    #   ano_anterior / variacao_ano: mesmo período do ano anterior (YoY)
+    #   acumulado: total corrido desde o início do período pedido
+    #   media_7d / media_30d: médias móveis de 7 e 30 dias (só na série diária)
+    #   meta: meta do mês (só na série mensal)
+    # Os períodos são inteiros: semanas e meses que tocam [inicio, fim] entram completos.
+    # A leitura começa um ano antes de inicio para as comparações e médias do começo.
+    # filiais restringe às filiais do usuário. Retorna (sql, parametros).
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade desconhecida: {granularidade}")
+    _validar_coluna(medida, MEDIDAS_SERIE)
+    chave, passo, periodos_ano = GRANULARIDADES[granularidade]
+    inicio, fim = _data_iso(inicio), _data_iso(fim)
+    diario = granularidade == 'dia'
+    restricao, parametros_filiais = [], []
+    _filtro_valores('filial', filiais, restricao, parametros_filiais)
+    restricao = "".join(f" AND {condicao}" for condicao in restricao)
+    media = lambda dias: (
+        f"SUM(valor) OVER (ORDER BY periodo ROWS BETWEEN {dias - 1} PRECEDING AND CURRENT ROW) / {dias}.0"
+        if diario else "NULL"
+    )
+    sql = f"""
+        WITH RECURSIVE calendario(periodo) AS (
+            SELECT {chave.format("date(?, '-1 year')")}
+            UNION ALL
+            SELECT date(periodo, '{passo}') FROM calendario WHERE periodo < {chave.format('?')}
+        ), agregado AS (
+            SELECT {chave.format('dia')} AS periodo, SUM({medida}) AS valor
+            FROM rollup_dia
+            WHERE dia >= {chave.format("date(?, '-1 year')")} AND dia < date({chave.format('?')}, '{passo}'){restricao}
+            GROUP BY 1
+        ), janelas AS (
+            SELECT c.periodo, COALESCE(a.valor, 0) AS valor,
+                   LAG(COALESCE(a.valor, 0), 1) OVER (ORDER BY c.periodo) AS anterior,
+                   LAG(COALESCE(a.valor, 0), {periodos_ano}) OVER (ORDER BY c.periodo) AS ano_anterior
+            FROM calendario c LEFT JOIN agregado a ON a.periodo = c.periodo
+        ), medias AS (
+            SELECT *, {media(7)} AS media_7d, {media(30)} AS media_30d FROM janelas
+        )
+        SELECT m.periodo, m.valor, m.anterior, m.ano_anterior,
+               (m.valor - m.anterior) / NULLIF(abs(m.anterior), 0) AS variacao_anterior,
+               (m.valor - m.ano_anterior) / NULLIF(abs(m.ano_anterior), 0) AS variacao_ano,
+               SUM(m.valor) OVER (ORDER BY m.periodo ROWS UNBOUNDED PRECEDING) AS acumulado,
+               m.media_7d, m.media_30d,
+               {"metas.valor" if granularidade == 'mes' else "NULL"} AS meta
+        FROM medias m
+        {"LEFT JOIN metas ON metas.mes = substr(m.periodo, 1, 7)" if granularidade == 'mes' else ""}
+        WHERE m.periodo >= {chave.format('?')}
+        ORDER BY m.periodo
+    """
+    return sql, [inicio, fim, inicio, fim, *parametros_filiais, inicio]
+
+@em_cache(token_dados)
+@cronometrado('sql:serie_temporal')
+def serie_temporal(granularidade='dia', inicio=None, fim=None, medida='valor', filiais=None):
+    # Série diária, semanal (semanas começando na segunda) ou mensal; ver montar_serie_temporal.
+    # O índice é o dia, a segunda-feira da semana ou o mês (Period AAAA-MM), nunca só o nome do mês.
+    if inicio is None or fim is None:
+        intervalo = intervalo_datas(filiais)
+        if intervalo is None:
+            return pd.DataFrame(columns=COLUNAS_SERIE).set_index('periodo')
+        inicio, fim = inicio or intervalo[0], fim or intervalo[1]
+    sql, parametros = montar_serie_temporal(granularidade, inicio, fim, medida, filiais)
+    with conexao_leitura() as conn:
+        df = pd.read_sql_query(sql, conn, params=parametros, parse_dates=['periodo'])
+    df = df.set_index('periodo').astype('float64')
+    if granularidade == 'mes':
+        df.index = df.index.to_period('M')
+    return df
+
+@em_cache(token_dados)
+def metas():
+    # Metas mensais cadastradas: mês (AAAA-MM) -> valor
+    with conexao_leitura() as conn:
+        return pd.read_sql_query("SELECT mes, valor FROM metas ORDER BY mes", conn).set_index('mes')['valor']
+
+def salvar_metas(novas):
+    # Substitui as metas pelas de novas (mapeamento AAAA-MM -> valor; valores vazios removem a meta)
+    registros = []
+    for mes, valor in dict(novas).items():
+        mes = pd.Period(str(mes), freq='M').strftime('%Y-%m')
+        if valor is not None and not pd.isna(valor):
+            registros.append((mes, float(valor)))
+    with conexao_escrita() as conn:
+        with conn:
+            conn.execute("DELETE FROM metas")
+            conn.executemany("INSERT INTO metas (mes, valor) VALUES (?, ?)", registros)
+            # As séries em cache trazem a meta: a versão nova as invalida
+            _incrementar_versao_dados(conn)
+    return len(registros)
+
@@ -0,0 +1,134 @@
+# Importação em lote de CSVs diários ("Diario dd-mm.csv") direto para o banco, sem o Streamlit.
+#
+#   python importar_lote.py data/historico/
+#   python importar_lote.py "backup/2024/Diario *.csv" --processos 4
+#
+# A leitura e a conversão dos arquivos rodam num pool de processos; a gravação fica no
+# processo principal, um arquivo por transação. Cada arquivo importado entra no registro de
+# ingestões (hash do conteúdo), então rodar de novo após uma falha continua de onde parou.
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import db_utils
+from csv_utils import TAMANHO_BLOCO, ler_csv_em_blocos
+
+def listar_arquivos(entradas, padrao='*.csv'):
+    # Aceita diretórios (busca padrao dentro deles), arquivos e globs
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            arquivos.extend(glob.glob(os.path.join(entrada, padrao)))
+        else:
+            arquivos.extend(glob.glob(entrada))
+    return sorted(set(os.path.abspath(a) for a in arquivos))
+
+def _iniciar_processo(caminho_db):
+    db_utils.configurar_db(caminho_db)
+
+def _preparar_arquivo(caminho, tamanho_bloco):
+    # Roda nos processos do pool: lê, padroniza e converte o arquivo inteiro
+    inicio = time.perf_counter()
+    resultado = {'caminho': caminho, 'bytes': os.path.getsize(caminho), 'blocos': None, 'erro': None}
+    try:
+        resultado['hash'] = db_utils.hash_arquivo_em_disco(caminho)
+        if not db_utils.arquivo_ja_ingerido(resultado['hash']):
+            resultado['blocos'] = [db_utils.preparar_vendas(b) for b in ler_csv_em_blocos(caminho, tamanho_bloco)]
+    except Exception as e:
+        resultado['erro'] = f"{type(e).__name__}: {e}"
+    resultado['segundos_leitura'] = time.perf_counter() - inicio
+    return resultado
+
+def _preparados_em_ordem(executor, arquivos, tamanho_bloco, janela):
+    # Devolve os arquivos preparados na ordem da lista (a gravação segue a ordem dos nomes),
+    # com no máximo "janela" arquivos lidos aguardando gravação, para limitar a memória
+    pendentes = deque()
+    for caminho in arquivos:
+        pendentes.append(executor.submit(_preparar_arquivo, caminho, tamanho_bloco))
+        if len(pendentes) >= janela:
+            yield pendentes.popleft().result()
+    while pendentes:
+        yield pendentes.popleft().result()
+
+def importar(arquivos, processos=None, tamanho_bloco=TAMANHO_BLOCO, saida=sys.stdout):
+    resumo = {'importados': 0, 'ignorados': 0, 'falhas': 0, 'linhas': 0, 'rejeitadas': 0, 'bytes': 0}
+    inicio = time.perf_counter()
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=processos, mp_context=contexto,
+        initializer=_iniciar_processo, initargs=(str(db_utils.DB_FILE),)
+    ) as executor:
+        janela = 2 * (processos or os.cpu_count() or 1)
+        for resultado in _preparados_em_ordem(executor, arquivos, tamanho_bloco, janela):
+            nome = Path(resultado['caminho']).name
+            if resultado['erro']:
+                resumo['falhas'] += 1
+                print(f"[falhou]   {nome}: {resultado['erro']}", file=saida)
+                continue
+            if resultado['blocos'] is None:
+                resumo['ignorados'] += 1
+                print(f"[ignorado] {nome}: já importado", file=saida)
+                continue
+            try:
+                gravacao = db_utils.ingerir_blocos(
+                    resultado['blocos'], hash_arquivo=resultado['hash'], nome_arquivo=nome,
+                    tamanho_bytes=resultado['bytes'], ja_preparados=True
+                )
+            except Exception as e:
+                resumo['falhas'] += 1
+                print(f"[falhou]   {nome}: {type(e).__name__}: {e}", file=saida)
+                continue
+            if gravacao['duplicado']:
+                resumo['ignorados'] += 1
+                print(f"[ignorado] {nome}: já importado", file=saida)
+                continue
+            resumo['importados'] += 1
+            resumo['linhas'] += gravacao['inseridos']
+            resumo['rejeitadas'] += gravacao['total_rejeitados']
+            resumo['bytes'] += resultado['bytes']
+            print(
+                f"[ok]       {nome}: {gravacao['inseridos']:,} vendas ({gravacao['atualizados']:,} substituídas), "
+                f"{gravacao['total_rejeitados']:,} rejeitadas "
+                f"(leitura {resultado['segundos_leitura']:.1f}s, gravação {gravacao['segundos']:.1f}s)",
+                file=saida
+            )
+    resumo['segundos'] = time.perf_counter() - inicio
+    return resumo
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importa em lote CSVs diários de vendas para o banco.")
+    parser.add_argument('entradas', nargs='+', help="diretórios, arquivos ou globs (use aspas)")
+    parser.add_argument('--padrao', default='*.csv', help="padrão de arquivo dentro de diretórios (padrão: *.csv)")
+    parser.add_argument('--processos', type=int, default=None, help="processos de leitura (padrão: nº de CPUs)")
+    parser.add_argument('--tamanho-bloco', type=int, default=TAMANHO_BLOCO, help="linhas por bloco de leitura")
+    parser.add_argument('--db', default=str(db_utils.DB_FILE), help="arquivo do banco SQLite")
+    args = parser.parse_args(argv)
+
+    db_utils.configurar_db(args.db)
+    db_utils.init_db()
+    arquivos = listar_arquivos(args.entradas, args.padrao)
+    if not arquivos:
+        print("Nenhum arquivo encontrado.")
+        return 1
+    print(f"{len(arquivos)} arquivo(s) para importar em {args.db}")
+    resumo = importar(arquivos, args.processos, args.tamanho_bloco)
+    segundos = resumo['segundos']
+    print(
+        f"\nImportados: {resumo['importados']} | ignorados: {resumo['ignorados']} | falhas: {resumo['falhas']}\n"
+        f"{resumo['linhas']:,} vendas gravadas, {resumo['rejeitadas']:,} linhas rejeitadas, "
+        f"{resumo['bytes'] / 1024 ** 2:,.1f} MB em {segundos:.1f}s "
+        f"({resumo['linhas'] / segundos if segundos else 0:,.0f} linhas/s, "
+        f"{resumo['bytes'] / 1024 ** 2 / segundos if segundos else 0:,.1f} MB/s)"
+    )
+    if resumo['falhas']:
+        print("Rode o mesmo comando de novo para reprocessar as falhas; os arquivos já importados serão ignorados.")
+    return 1 if resumo['falhas'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
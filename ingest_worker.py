@@ -0,0 +1,115 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from csv_utils import TAMANHO_BLOCO, ler_csv_em_blocos
+from db_utils import (
+    arquivo_ja_ingerido, atualizar_job_ingestao, criar_job_ingestao, hash_arquivo_em_disco,
+    hash_conteudo, ingerir_blocos, listar_jobs_ingestao, ultimo_job_para_hash
+)
+
+# Arquivos recebidos ficam aqui até o job terminar, para sobreviver a um reinício do app
+UPLOADS_DIR = Path("data/uploads")
+
+# Um único worker: as importações são gravadas uma de cada vez (o SQLite tem um só escritor)
+_executor = None
+_lock = threading.Lock()
+# Linhas gravadas pelos jobs em execução; o banco só é atualizado no início e no fim
+# do job, porque a transação da importação ocupa o escritor enquanto ela roda
+_progresso = {}
+
+def _agora():
+    return datetime.now().isoformat(timespec='seconds')
+
+def ingerir_arquivo(caminho, nome_arquivo=None, hash_arquivo=None, tamanho_bloco=TAMANHO_BLOCO, progresso=None):
+    # Importa um CSV do disco em streaming: memória constante qualquer que seja o tamanho.
+    # O resumo de ingerir_blocos inclui linhas/s e bytes/s do arquivo.
+    if hash_arquivo is None:
+        hash_arquivo = hash_arquivo_em_disco(caminho)
+    return ingerir_blocos(
+        ler_csv_em_blocos(caminho, tamanho_bloco),
+        hash_arquivo=hash_arquivo, nome_arquivo=nome_arquivo or Path(caminho).name,
+        progresso=progresso, tamanho_bytes=os.path.getsize(caminho)
+    )
+
+def _executar_job(job_id, caminho, hash_arquivo, nome_arquivo):
+    atualizar_job_ingestao(job_id, status='executando', iniciado_em=_agora())
+    _progresso[job_id] = 0
+    try:
+        resultado = ingerir_arquivo(
+            caminho, nome_arquivo=nome_arquivo, hash_arquivo=hash_arquivo,
+            progresso=lambda linhas: _progresso.__setitem__(job_id, linhas)
+        )
+        caminho_rejeitados = None
+        if not resultado['rejeitados'].empty:
+            caminho_rejeitados = UPLOADS_DIR / f"{hash_arquivo}_rejeitados.csv"
+            resultado['rejeitados'].to_csv(caminho_rejeitados, index=False, sep=';')
+        atualizar_job_ingestao(
+            job_id, status='concluido', finalizado_em=_agora(),
+            linhas_processadas=resultado['linhas_lidas'], inseridos=resultado['inseridos'],
+            rejeitados=resultado['total_rejeitados'], bytes=resultado['bytes'], segundos=resultado['segundos'],
+            caminho_rejeitados=str(caminho_rejeitados) if caminho_rejeitados else None,
+        )
+        Path(caminho).unlink(missing_ok=True)
+    except Exception as e:
+        # A importação é uma única transação: em caso de erro nada foi gravado em vendas
+        atualizar_job_ingestao(job_id, status='falhou', finalizado_em=_agora(), erro=str(e))
+    finally:
+        _progresso.pop(job_id, None)
+
+def iniciar_worker():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingestao')
+            _retomar_pendentes(_executor)
+        return _executor
+
+def _retomar_pendentes(executor):
+    # Jobs que ficaram na fila ou pela metade quando o processo anterior parou
+    pendentes = listar_jobs_ingestao(limite=None, status=['na_fila', 'executando'])
+    for job in pendentes.sort_values('id').itertuples():
+        if Path(job.caminho).exists():
+            executor.submit(_executar_job, job.id, job.caminho, job.hash, job.nome_arquivo)
+        else:
+            atualizar_job_ingestao(job.id, status='falhou', finalizado_em=_agora(), erro='arquivo do upload não encontrado')
+
+def enfileirar_upload(conteudo, nome_arquivo):
+    # Devolve o id do job (novo ou já existente para o mesmo conteúdo),
+    # ou None se o arquivo já foi importado. Um job que falhou não é refeito
+    # sozinho a cada rerun: use reprocessar_job.
+    hash_arquivo = hash_conteudo(conteudo)
+    if arquivo_ja_ingerido(hash_arquivo):
+        return None
+    executor = iniciar_worker()
+    with _lock:
+        existente = ultimo_job_para_hash(hash_arquivo)
+        if existente is not None and existente[1] != 'concluido':
+            return existente[0]
+        UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+        caminho = UPLOADS_DIR / f"{hash_arquivo}.csv"
+        caminho.write_bytes(conteudo)
+        job_id = criar_job_ingestao(hash_arquivo, nome_arquivo, caminho)
+        executor.submit(_executar_job, job_id, str(caminho), hash_arquivo, nome_arquivo)
+    return job_id
+
+def reprocessar_job(job_id):
+    # Coloca de novo na fila um job que falhou; o arquivo enviado é mantido em caso de falha
+    jobs = listar_jobs_ingestao(limite=None, status='falhou')
+    job = jobs[jobs['id'] == job_id]
+    if job.empty or not Path(job['caminho'].iloc[0]).exists():
+        return False
+    job = job.iloc[0]
+    atualizar_job_ingestao(job_id, status='na_fila', erro=None, iniciado_em=None, finalizado_em=None)
+    iniciar_worker().submit(_executar_job, job_id, job['caminho'], job['hash'], job['nome_arquivo'])
+    return True
+
+def jobs_recentes(limite=5):
+    # Jobs mais recentes, com o progresso em memória dos que estão executando
+    jobs = listar_jobs_ingestao(limite=limite)
+    for indice, job_id in jobs['id'].items():
+        if job_id in _progresso:
+            jobs.loc[indice, 'linhas_processadas'] = _progresso[job_id]
+    return jobs
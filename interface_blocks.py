@@ -1,17 +1,18 @@
 import streamlit as st
 import pandas as pd
-from db_utils import insert_sales_from_csv, get_sales
-from auth_utils import load_users, save_users, authenticate, get_user_profile
+import hll_utils
+from db_utils import filiais_disponiveis, intervalo_datas, metas, pagina_vendas, salvar_metas
+from ingest_worker import enfileirar_upload, jobs_recentes, reprocessar_job
+from auth_utils import load_users, add_user, authenticate, get_user_filiais, get_user_profile, logout
 import os
 import altair as alt
-import tempfile
-import pdfkit
 import matplotlib.pyplot as plt
-import base64
-import shutil
-from altair_saver import save as altair_save
-import unicodedata
 import numpy as np
+from cache_utils import CACHE
+from kpi_engine import indicadores, serie_ranking
+from pdf_worker import solicitar_relatorio, status_relatorio
+import metricas_utils
+from metricas_utils import REGISTRO, cronometrado, exportar_prometheus, medir
 
 def login_block():
     st.title("🔐 Login")
@@ -32,12 +33,29 @@ def login_block():
         else:
             st.error("Usuário ou senha inválidos.")
 
+def filiais_usuario():
+    # Filiais que o usuário logado pode ver (None = todas). Vai em toda consulta de
+    # dados, que filtra no SQL e separa as entradas do cache por filial.
+    return get_user_filiais(st.session_state.usuario)
+
+def modo_aproximado():
+    # Chave da barra lateral: contagens de distintos por HyperLogLog e séries diárias
+    # reduzidas, para períodos longos (ver kpi_engine.SECOES_APROXIMADAS)
+    return bool(st.session_state.get('modo_aproximado', False))
+
+def _rotulo_aproximado(rotulo):
+    return f"{rotulo} (≈ ±{hll_utils.LIMITE_ERRO_95:.0%})" if modo_aproximado() else rotulo
+
+def _rotulo_filiais(filiais):
+    return "todas as filiais" if filiais is None else ", ".join(filiais) or "nenhuma filial"
+
 def pagina_usuario():
     st.title("👤 Meu Perfil")
     usuario = st.session_state.usuario
     perfil = get_user_profile(usuario)
     st.markdown(f"**Usuário:** `{usuario}`")
     st.markdown(f"**Perfil:** `{perfil}`")
+    st.markdown(f"**Acesso:** {_rotulo_filiais(filiais_usuario())}")
     st.info("Entre em contato com o administrador para alterar seus dados.")
 
 def pagina_admin_usuarios():
@@ -45,173 +63,189 @@ def pagina_admin_usuarios():
     users = load_users()
     st.markdown("**Usuários cadastrados:**")
     for user, info in users.items():
-        st.markdown(f"- **{user}** ({info['perfil']})")
+        st.markdown(f"- **{user}** ({info['perfil']}, {_rotulo_filiais(get_user_filiais(user))})")
     st.divider()
     st.subheader("Adicionar novo usuário")
     new_user = st.text_input("Novo usuário")
     new_pass = st.text_input("Senha", type="password")
     new_profile = st.selectbox("Perfil", ["admin", "comum"])
+    new_filiais = None
+    if new_profile == "comum":
+        new_filiais = st.multiselect(
+            "Filiais", filiais_disponiveis(), help="Vazio: o usuário vê todas as filiais."
+        ) or None
     if st.button("Adicionar usuário"):
-        if new_user in users:
+        if not add_user(new_user, new_pass, new_profile, new_filiais):
             st.warning("Usuário já existe.")
         else:
-            users[new_user] = {"senha": new_pass, "perfil": new_profile}
-            save_users(users)
             st.success("Usuário adicionado com sucesso!")
-
-def gerar_pdf_dashboard_diario(df_filtrado, kpis, chart_top_clientes, chart_vendas_tempo):
-    # Salva gráficos como imagens temporárias
-    tempdir = tempfile.mkdtemp()
-    img_top_clientes = os.path.join(tempdir, 'top_clientes.png')
-    img_vendas_tempo = os.path.join(tempdir, 'vendas_tempo.png')
-    altair_save(chart_top_clientes, img_top_clientes, method='selenium')
-    altair_save(chart_vendas_tempo, img_vendas_tempo, method='selenium')
-
-    # Gera HTML estilizado
-    html = f'''
-    <html>
-    <head>
-    <style>
-    body {{ font-family: Arial, sans-serif; margin: 40px; }}
-    h1 {{ text-align: center; }}
-    .kpis {{ display: flex; justify-content: space-around; margin-bottom: 30px; }}
-    .kpi {{ background: #f2f2f2; border-radius: 10px; padding: 20px; text-align: center; width: 22%; }}
-    .section {{ margin-bottom: 30px; }}
-    table {{ border-collapse: collapse; width: 100%; }}
-    th, td {{ border: 1px solid #ddd; padding: 8px; }}
-    th {{ background: #eee; }}
-    </style>
-    </head>
-    <body>
-    <h1>Relatório Diário de Vendas</h1>
-    <div class="kpis">
-        <div class="kpi"><b>Total de Vendas</b><br>{kpis['total_vendas']}</div>
-        <div class="kpi"><b>Clientes Únicos</b><br>{kpis['clientes_unicos']}</div>
-        <div class="kpi"><b>Ticket Médio</b><br>R$ {kpis['ticket_medio']:,.2f}</div>
-        <div class="kpi"><b>Total Vendido</b><br>R$ {kpis['total_vendido']:,.2f}</div>
-    </div>
-    <div class="section">
-        <h2>Top 10 Clientes</h2>
-        <img src="data:image/png;base64,{base64.b64encode(open(img_top_clientes, 'rb').read()).decode()}" width="700"/>
-    </div>
-    <div class="section">
-        <h2>Vendas ao Longo do Tempo</h2>
-        <img src="data:image/png;base64,{base64.b64encode(open(img_vendas_tempo, 'rb').read()).decode()}" width="700"/>
-    </div>
-    <div class="section">
-        <h2>Tabela de Vendas Filtradas</h2>
-        {df_filtrado.head(30).to_html(index=False)}
-        <p style="font-size:12px;color:#888;">Exibindo as 30 primeiras linhas.</p>
-    </div>
-    </body>
-    </html>
-    '''
-    # Salva HTML temporário
-    html_path = os.path.join(tempdir, 'relatorio.html')
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(html)
-    # Gera PDF
-    pdf_path = os.path.join(tempdir, 'relatorio.pdf')
-    pdfkit.from_file(html_path, pdf_path)
-    # Lê PDF para download
-    with open(pdf_path, 'rb') as f:
-        pdf_bytes = f.read()
-    # Limpa arquivos temporários
-    shutil.rmtree(tempdir)
-    return pdf_bytes
-
-def padronizar_colunas(df):
-    # Remove acentos e caracteres especiais, deixa tudo minúsculo e sem espaços
-    def clean(col):
-        col = unicodedata.normalize('NFKD', col).encode('ASCII', 'ignore').decode('ASCII')
-        return col.strip().lower().replace(' ', '_').replace('.', '').replace('(', '_').replace(')', '_')
-    cols = [clean(c) for c in df.columns]
-    # Renomear duplicadas
-    seen = {}
-    new_cols = []
-    for c in cols:
-        if c not in seen:
-            seen[c] = 0
-            new_cols.append(c)
-        else:
-            seen[c] += 1
-            new_cols.append(f"{c}_{seen[c]}")
-    df.columns = new_cols
-    # Mapeamento completo para todos os campos do CSV
-    col_map = {
-        'data_competencia': 'data_competencia',
-        'hora': 'hora',
-        'no_venda': 'numero_venda',
-        'no_nf': 'numero_nf',
-        'codigo': 'codigo_produto',
-        'codigo_1': 'codigo_aux1',
-        'codigo_2': 'codigo_aux2',
-        'parceiro': 'parceiro',
-        'quantidade': 'quantidade',
-        'qtd': 'quantidade',
-        'acrescimo': 'acrescimo',
-        'desconto': 'desconto',
-        'total': 'total',
-        'desp_acess': 'desp_acess',
-        'valor_frete_cif': 'valor_frete_cif',
-        'valor_seguro': 'valor_seguro',
-        'valor_seguro_1': 'valor_seguro_1',
-        'total_venda': 'total_venda',
-        'percentual_desc': 'percentual_desc',
-        'total_preco_base': 'total_preco_base',
-        'operacao': 'operacao',
-        'n_d': 'n_d',
-        'n_e': 'n_e',
-        'c': 'c',
-        'no_c_fiscal': 'numero_c_fiscal',
-        'no_vendedor': 'numero_vendedor',
-        'vendedor': 'vendedor',
-        'tipo_da_condicao': 'tipo_da_condicao',
-        'tipodacondicao': 'tipo_da_condicao',
-        'tipo_condicao': 'tipo_da_condicao',
-        'tipo_da_condicao_1': 'tipo_da_condicao',
-        'data_saida': 'data_saida',
-        'forma': 'forma_pagamento',
-        'transportadora': 'transportadora',
-        'tipo_frete': 'tipo_frete',
-        'valor_frete': 'valor_frete',
-        'placa': 'placa',
-        'uf_placa': 'uf_placa',
-        'especie': 'especie',
-        'marca': 'marca',
-        'quantidade_volume': 'quantidade_volume',
-        'peso_bruto': 'peso_bruto',
-        'peso_liquido': 'peso_liquido',
-        'obs': 'obs',
-        'no_loja_cf': 'numero_loja_cf',
-        'no_cx_cf': 'numero_cx_cf',
-        'no_serie_imp_cf': 'numero_serie_imp_cf',
-        'endereco_entrega': 'endereco_entrega',
-        'bairro_entrega': 'bairro_entrega',
-        'cidade_entrega': 'cidade_entrega',
-        'cep_entrega': 'cep_entrega',
-        'uf_entrega': 'uf_entrega',
-        'filial': 'filial',
-        'operador': 'operador',
-        'operador_cancelamento': 'operador_cancelamento',
-        'cod': 'cod',
-        'nome_motorista': 'nome_motorista',
-        'operador_entrega': 'operador_entrega',
-        'data_entrega': 'data_entrega',
-        'nome_autorizado': 'nome_autorizado',
-        'sit_email': 'sit_email',
-        'n_pedido': 'numero_pedido',
-        'obra': 'obra',
-        'desc_obra': 'desc_obra',
-        'no_despacho': 'numero_despacho',
-        # Adicione outros campos conforme necessário
+    st.divider()
+    st.subheader("Cache de dados")
+    stats = CACHE.estatisticas()
+    c1, c2, c3, c4, c5 = st.columns(5)
+    c1.metric("Acertos", stats['acertos'])
+    c2.metric("Faltas", stats['faltas'])
+    c3.metric("Remoções (LRU)", stats['remocoes'])
+    c4.metric("Invalidações", stats['invalidacoes'])
+    c5.metric("Taxa de acerto", f"{stats['taxa_acerto']:.0%}")
+    st.caption(
+        f"{stats['itens']} resultados em cache, "
+        f"{stats['bytes_usados'] / 1024 ** 2:,.1f} MB de {stats['limite_bytes'] / 1024 ** 2:,.0f} MB."
+    )
+    if st.button("Limpar cache"):
+        CACHE.limpar()
+        st.success("Cache limpo.")
+
+def pagina_admin_desempenho():
+    st.title("⏱️ Desempenho")
+    st.caption(
+        "Duração das etapas de cada renderização (últimas medições de cada etapa, em ms). "
+        "Etapas \"sql:\" só rodam quando o resultado não está em cache."
+    )
+    resumo = REGISTRO.resumo()
+    if resumo.empty:
+        st.info("Nenhuma medição ainda. Navegue pelos dashboards e volte aqui.")
+    else:
+        st.dataframe(
+            resumo.sort_values('p95_ms', ascending=False).style.format({
+                'p50_ms': '{:,.1f}', 'p95_ms': '{:,.1f}', 'p99_ms': '{:,.1f}', 'max_ms': '{:,.1f}',
+                'linhas_media': '{:,.0f}', 'bytes_media': '{:,.0f}',
+            }, na_rep='—'),
+            use_container_width=True, hide_index=True
+        )
+    st.divider()
+    st.subheader("Prometheus")
+    arquivo = metricas_utils.ARQUIVO_PROMETHEUS
+    if arquivo is None:
+        st.markdown("A gravação do arquivo de métricas está desligada neste processo.")
+    else:
+        st.markdown(f"As métricas são gravadas em `{arquivo}` (formato texto do Prometheus).")
+    c1, c2 = st.columns(2)
+    if c1.button("Gravar métricas agora", disabled=arquivo is None):
+        exportar_prometheus()
+        st.success("Arquivo atualizado.")
+    if c2.button("Zerar medições"):
+        REGISTRO.limpar()
+        st.success("Medições zeradas.")
+
+def pagina_admin_metas():
+    st.title("🎯 Metas")
+    st.caption("Meta de faturamento de cada mês, usada nos gráficos de faturamento x meta. Apague o valor para remover a meta.")
+    atuais = metas()
+    intervalo = intervalo_datas()
+    meses = set(atuais.index)
+    if intervalo is not None:
+        # Sugere todos os meses com vendas e os próximos 12
+        fim = max(pd.Period(intervalo[1], freq='M'), pd.Period.now('M')) + 12
+        meses |= {str(m) for m in pd.period_range(pd.Period(intervalo[0], freq='M'), fim, freq='M')}
+    tabela = pd.DataFrame({'mes': sorted(meses)})
+    tabela['meta'] = tabela['mes'].map(atuais)
+    editada = st.data_editor(
+        tabela, hide_index=True, use_container_width=True, disabled=['mes'],
+        column_config={
+            'mes': st.column_config.TextColumn("Mês"),
+            'meta': st.column_config.NumberColumn("Meta (R$)", min_value=0.0, format="%.2f"),
+        },
+        key="editor_metas"
+    )
+    if st.button("Salvar metas"):
+        quantidade = salvar_metas(dict(zip(editada['mes'], editada['meta'])))
+        st.success(f"{quantidade} metas salvas.")
+
+def periodo_selecionado():
+    # Período escolhido na barra lateral; (None, None) enquanto não houver seleção completa
+    periodo = st.session_state.get('periodo')
+    if isinstance(periodo, (list, tuple)) and len(periodo) == 2:
+        return periodo[0], periodo[1]
+    return None, None
+
+COLUNAS_TABELA_VENDAS = [
+    'data_competencia', 'numero_venda', 'parceiro', 'valor', 'quantidade', 'vendedor',
+    'tipo_da_condicao', 'forma_pagamento', 'cidade_entrega', 'filial'
+]
+ROTULOS_ORDENACAO = {'data_competencia': 'Data', 'valor': 'Valor'}
+
+def tabela_vendas_paginada(inicio, fim, chave):
+    # Tabela de vendas com filtros e ordenação feitos no banco. A navegação guarda os
+    # cursores das páginas já vistas: avançar e voltar custam uma consulta de uma página.
+    with st.expander("Filtros e ordenação"):
+        f1, f2, f3 = st.columns(3)
+        parceiro = f1.text_input("Parceiro (começa com)", key=f"{chave}_parceiro").strip().upper()
+        por_vendedor = indicadores('vendedores', inicio, fim, filiais_usuario()).por_vendedor
+        vendedores = f2.multiselect("Vendedor", list(por_vendedor.index), key=f"{chave}_vendedor")
+        filiais = f3.multiselect("Filial", filiais_disponiveis(filiais_usuario()), key=f"{chave}_filial")
+        condicoes = indicadores('condicoes', inicio, fim, filiais_usuario())
+        f4, f5, f6 = st.columns(3)
+        formas = f4.multiselect("Forma de pagamento", list(condicoes.por_forma.index), key=f"{chave}_forma")
+        tipos = f5.multiselect("Tipo da condição", list(condicoes.por_tipo.index), key=f"{chave}_tipo")
+        numero_venda = f6.text_input("Nº da venda", key=f"{chave}_numero").strip()
+        o1, o2, o3 = st.columns(3)
+        ordenar_por = o1.selectbox("Ordenar por", list(ROTULOS_ORDENACAO), format_func=ROTULOS_ORDENACAO.get, key=f"{chave}_ordem")
+        decrescente = o2.radio("Direção", ["Decrescente", "Crescente"], horizontal=True, key=f"{chave}_direcao") == "Decrescente"
+        tamanho = o3.selectbox("Linhas por página", [25, 50, 100], index=1, key=f"{chave}_tamanho")
+
+    argumentos = {
+        'colunas': COLUNAS_TABELA_VENDAS, 'inicio': inicio, 'fim': fim, 'ordenar_por': ordenar_por,
+        'decrescente': decrescente, 'tamanho': tamanho, 'parceiro_prefixo': parceiro or None,
+        'vendedor': vendedores or None, 'filial': filiais or None, 'forma_pagamento': formas or None,
+        'tipo_da_condicao': tipos or None, 'numero_venda': numero_venda or None,
+        'filiais': filiais_usuario(),
     }
-    df = df.rename(columns={c: col_map.get(c, c) for c in df.columns})
-    # Garante que todas as colunas do mapeamento existam, mesmo que vazias
-    for col in col_map.values():
-        if col not in df.columns:
-            df[col] = ''
-    return df
+    # Mudou filtro, ordenação ou período: volta para a primeira página
+    assinatura = repr(sorted(argumentos.items()))
+    if st.session_state.get(f"{chave}_assinatura") != assinatura:
+        st.session_state[f"{chave}_assinatura"] = assinatura
+        st.session_state[f"{chave}_cursores"] = [None]
+    cursores = st.session_state[f"{chave}_cursores"]
+
+    df, proxima = pagina_vendas(apos=cursores[-1], **argumentos)
+    st.dataframe(df.drop(columns='id'), use_container_width=True, height=350, hide_index=True)
+    n1, n2, n3, n4 = st.columns([1, 1, 1, 3])
+    if n1.button("⏮ Primeira", key=f"{chave}_primeira", disabled=len(cursores) == 1):
+        del cursores[1:]
+        st.rerun()
+    if n2.button("◀ Anterior", key=f"{chave}_anterior", disabled=len(cursores) == 1):
+        cursores.pop()
+        st.rerun()
+    if n3.button("Próxima ▶", key=f"{chave}_proxima", disabled=proxima is None):
+        cursores.append(proxima)
+        st.rerun()
+    n4.caption(f"Página {len(cursores)} · {len(df)} linhas")
+
+ROTULOS_STATUS_JOB = {
+    'na_fila': '⏳ Na fila',
+    'executando': '⚙️ Importando',
+    'concluido': '✅ Concluído',
+    'falhou': '❌ Falhou',
+}
+
+def painel_importacoes():
+    jobs = jobs_recentes()
+    if jobs.empty:
+        return
+    with st.sidebar.expander("Importações recentes", expanded=jobs['status'].isin(['na_fila', 'executando']).any()):
+        for job in jobs.itertuples():
+            st.markdown(f"**{job.nome_arquivo}** — {ROTULOS_STATUS_JOB.get(job.status, job.status)}")
+            if job.status == 'executando':
+                st.caption(f"{job.linhas_processadas:,} linhas gravadas")
+            elif job.status == 'concluido':
+                st.caption(f"{int(job.inseridos):,} vendas gravadas, {int(job.rejeitados):,} linhas rejeitadas")
+                if job.segundos:
+                    st.caption(
+                        f"{job.linhas_processadas / job.segundos:,.0f} linhas/s · "
+                        f"{job.bytes / job.segundos / 1024 ** 2:,.1f} MB/s"
+                    )
+                if job.caminho_rejeitados and os.path.exists(job.caminho_rejeitados):
+                    with open(job.caminho_rejeitados, 'rb') as f:
+                        st.download_button(
+                            "Baixar linhas rejeitadas", f.read(),
+                            file_name=f"rejeitados_{job.nome_arquivo}", mime="text/csv", key=f"rej_{job.id}"
+                        )
+            elif job.status == 'falhou':
+                st.caption(f"Nada foi gravado. Erro: {job.erro}")
+                if st.button("Tentar novamente", key=f"retry_{job.id}"):
+                    reprocessar_job(job.id)
+        st.button("🔄 Atualizar status", key="btn_atualizar_jobs")
 
 def sidebar_customizada(perfil):
     st.sidebar.markdown("""
@@ -227,10 +261,12 @@ def sidebar_customizada(perfil):
         st.sidebar.markdown("### 📁 Upload de novo CSV")
         uploaded_file = st.sidebar.file_uploader("Selecione um arquivo .csv", type="csv")
         if uploaded_file:
-            df_novo = pd.read_csv(uploaded_file, sep=';', encoding='latin1')
-            df_novo = padronizar_colunas(df_novo)
-            insert_sales_from_csv(df_novo)
-            st.sidebar.success("Arquivo carregado e dados inseridos com sucesso!")
+            # A importação roda em segundo plano; reruns com o mesmo arquivo anexado
+            # reaproveitam o job existente (ou nada fazem, se já foi importado)
+            job_id = enfileirar_upload(uploaded_file.getvalue(), uploaded_file.name)
+            if job_id is None:
+                st.sidebar.info("Este arquivo já foi importado.")
+        painel_importacoes()
     st.sidebar.markdown('<div class="sidebar-title">📊 Dashboards</div>', unsafe_allow_html=True)
     dashboards = [
         ("Relatório Diário", "📅"),
@@ -242,11 +278,30 @@ def sidebar_customizada(perfil):
         if st.sidebar.button(f"{icone} {dash}", key=f"btn_{dash}"):
             st.session_state.dashboard = dash
             st.session_state.pagina = 'dashboard'
+    limites = intervalo_datas(filiais_usuario())
+    if limites:
+        st.sidebar.markdown('<div class="sidebar-title">🗓️ Período</div>', unsafe_allow_html=True)
+        st.sidebar.date_input(
+            "Período", value=limites, min_value=limites[0], max_value=limites[1],
+            key='periodo', format="DD/MM/YYYY", label_visibility="collapsed"
+        )
+        st.sidebar.toggle(
+            "Modo aproximado", key='modo_aproximado',
+            help=(
+                "Clientes únicos e total de vendas estimados por HyperLogLog (erro de até "
+                f"±{hll_utils.LIMITE_ERRO_95:.1%} em 95% dos casos) e gráficos diários com no máximo "
+                "algumas centenas de pontos. Mais rápido em períodos de vários anos; desligado, tudo é exato."
+            )
+        )
     st.sidebar.divider()
     if perfil == "admin":
         st.sidebar.markdown('<div class="sidebar-title">⚙️ Administração</div>', unsafe_allow_html=True)
         if st.sidebar.button("👤 Gerenciar Usuários", key="btn_admin_usuarios"):
             st.session_state.pagina = "admin_usuarios"
+        if st.sidebar.button("⏱️ Desempenho", key="btn_admin_desempenho"):
+            st.session_state.pagina = "admin_desempenho"
+        if st.sidebar.button("🎯 Metas", key="btn_admin_metas"):
+            st.session_state.pagina = "admin_metas"
         if st.sidebar.button("📝 Meu Perfil", key="btn_meu_perfil"):
             st.session_state.pagina = "usuario"
     else:
@@ -255,6 +310,7 @@ def sidebar_customizada(perfil):
             st.session_state.pagina = "usuario"
     st.sidebar.divider()
     if st.sidebar.button("🚪 Sair", key="btn_sair"):
+        logout(st.session_state.usuario)
         st.session_state.logado = False
         st.session_state.usuario = ''
         st.session_state.pagina = 'dashboard'
@@ -266,7 +322,9 @@ def sidebar_customizada(perfil):
             except AttributeError:
                 pass
 
+@cronometrado()
 def dashboard_diario(perfil):
+    inicio, fim = periodo_selecionado()
     st.markdown("""
     <style>
     .kpi-card {
@@ -312,19 +370,17 @@ def dashboard_diario(perfil):
     <p style='text-align: left; color: #b0b8c1; margin-top: 0;'>Acompanhe as vendas do dia de forma visual e interativa</p>
     """, unsafe_allow_html=True)
     st.divider()
-    df = get_sales()
-    if df.empty:
+    # Os números vêm prontos do kpi_engine; aqui só se desenha
+    faturamento = indicadores('faturamento', inicio, fim, filiais_usuario(), modo_aproximado())
+    if faturamento.por_dia.empty:
         st.warning("Nenhum dado disponível. Faça upload de um CSV.")
         return
-    df = padronizar_colunas(df)
-    # Garantir que data_competencia é datetime antes de usar .dt
-    df['data_competencia'] = pd.to_datetime(df['data_competencia'], errors='coerce')
 
     # KPIs em cards
     kpi1, kpi2, kpi3 = st.columns(3)
-    faturamento_total = pd.to_numeric(df['valor'], errors='coerce').fillna(0).sum() if 'valor' in df.columns else 0
-    qtd_produtos = pd.to_numeric(df['quantidade'], errors='coerce').fillna(0).sum() if 'quantidade' in df.columns else 0
-    ticket_medio = faturamento_total / max(df['numero_venda'].nunique(), 1)
+    faturamento_total = faturamento.total
+    qtd_produtos = faturamento.quantidade
+    ticket_medio = faturamento.ticket_medio
     with kpi1:
         st.markdown(f"""
         <div class='kpi-card'>
@@ -345,7 +401,7 @@ def dashboard_diario(perfil):
         st.markdown(f"""
         <div class='kpi-card'>
             <span class='kpi-icon'>🧾</span>
-            <div class='kpi-title'>Ticket Médio</div>
+            <div class='kpi-title'>{_rotulo_aproximado('Ticket Médio')}</div>
             <div class='kpi-value'>R$ {ticket_medio:,.2f}</div>
         </div>
         """, unsafe_allow_html=True)
@@ -356,21 +412,23 @@ def dashboard_diario(perfil):
     colg1, colg2 = st.columns(2)
     with colg1:
         st.markdown("<div class='card-section'><div class='section-title'>Faturamento Mensal x Meta</div>", unsafe_allow_html=True)
-        # Garantir datetime antes de usar .dt
-        df['data_competencia'] = pd.to_datetime(df['data_competencia'], errors='coerce')
-        df['mes'] = df['data_competencia'].dt.strftime('%b')
-        fat_mes = df.groupby('mes')['valor'].sum().reindex(['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']).fillna(0)
-        meta = [faturamento_total/len(fat_mes)]*len(fat_mes) if len(fat_mes) > 0 else []
-        chart_fat = pd.DataFrame({'Faturamento': fat_mes, 'Meta': meta})
+        mensal = indicadores('temporal', inicio, fim, filiais_usuario(), modo_aproximado()).mensal
+        chart_fat = pd.DataFrame({'Faturamento': mensal['valor'], 'Meta': mensal['meta']})
+        chart_fat.index = chart_fat.index.astype(str)
         st.bar_chart(chart_fat, use_container_width=True)
+        if mensal['meta'].isna().all():
+            st.caption("Nenhuma meta cadastrada para o período (admin → 🎯 Metas).")
         st.markdown("</div>", unsafe_allow_html=True)
     with colg2:
         st.markdown("<div class='card-section'><div class='section-title'>Vendas de Produtos</div>", unsafe_allow_html=True)
-        df['quantidade_num'] = pd.to_numeric(df['quantidade'], errors='coerce').fillna(0)
-        prod_pizza = df.groupby('codigo_produto')['quantidade_num'].sum()
-        prod_pizza = prod_pizza[prod_pizza > 0]
+        prod_pizza = indicadores('produtos', inicio, fim, filiais_usuario()).quantidade_por_produto
         if not prod_pizza.empty:
-            st.pyplot(plt.pie(prod_pizza, labels=prod_pizza.index, autopct='%1.0f%%')[0].figure)
+            with medir('matplotlib:pizza_produtos'):
+                fig, ax = plt.subplots()
+                ax.pie(prod_pizza, labels=prod_pizza.index, autopct='%1.0f%%')
+            with medir('streamlit:pizza_produtos'):
+                st.pyplot(fig)
+            plt.close(fig)
         else:
             st.info('Nenhum dado de produto para exibir.')
         st.markdown("</div>", unsafe_allow_html=True)
@@ -378,7 +436,8 @@ def dashboard_diario(perfil):
     colg3, colg4 = st.columns(2)
     with colg3:
         st.markdown("<div class='card-section'><div class='section-title'>Vendas por Clientes</div>", unsafe_allow_html=True)
-        top_clientes = df.groupby('parceiro')['valor'].sum().sort_values(ascending=False).head(10)
+        clientes = indicadores('clientes', inicio, fim, filiais_usuario(), modo_aproximado())
+        top_clientes = clientes.top_clientes
         if not top_clientes.empty:
             st.bar_chart(top_clientes, use_container_width=True)
         else:
@@ -386,20 +445,16 @@ def dashboard_diario(perfil):
         st.markdown("</div>", unsafe_allow_html=True)
     with colg4:
         st.markdown("<div class='card-section'><div class='section-title'>Faturamento por Vendedor</div>", unsafe_allow_html=True)
-        if 'vendedor' in df.columns:
-            fat_vend = df.groupby('vendedor')['valor'].sum().sort_values(ascending=False)
-            if not fat_vend.empty:
-                st.bar_chart(fat_vend, use_container_width=True)
-            else:
-                st.info('Nenhum dado de vendedor para exibir.')
+        fat_vend = indicadores('vendedores', inicio, fim, filiais_usuario()).top_vendedores
+        if not fat_vend.empty:
+            st.bar_chart(fat_vend, use_container_width=True)
         else:
             st.info('Nenhum dado de vendedor para exibir.')
         st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("<div class='card-section'><div class='section-title'>Faturamento Mensal</div>", unsafe_allow_html=True)
-    # Garantir datetime antes de usar .dt
-    df['data_competencia'] = pd.to_datetime(df['data_competencia'], errors='coerce')
-    fat_mensal = df.groupby(df['data_competencia'].dt.month)['valor'].sum()
+    fat_mensal = pd.DataFrame({'Faturamento': mensal['valor'], 'Ano anterior': mensal['ano_anterior']})
+    fat_mensal.index = fat_mensal.index.astype(str)
     if not fat_mensal.empty:
         st.line_chart(fat_mensal, use_container_width=True)
     else:
@@ -407,19 +462,22 @@ def dashboard_diario(perfil):
     st.markdown("</div>", unsafe_allow_html=True)
 
     st.markdown("<div class='card-section'><div class='section-title'>Tabela de Vendas</div>", unsafe_allow_html=True)
-    st.dataframe(df[['data_competencia','numero_venda','parceiro','valor','quantidade','vendedor','tipo_da_condicao','forma_pagamento','cidade_entrega','filial']].head(30), use_container_width=True, height=350)
+    tabela_vendas_paginada(inicio, fim, chave='tabela_diario')
     st.markdown("</div>", unsafe_allow_html=True)
 
-    # Botão para gerar PDF
-    if st.button("⬇️ Baixar Relatório em PDF"):
-        kpis = {
-            'total_vendas': df['numero_venda'].nunique(),
-            'clientes_unicos': df['parceiro'].nunique(),
-            'ticket_medio': ticket_medio,
-            'total_vendido': faturamento_total
-        }
-        pdf_bytes = gerar_pdf_dashboard_diario(df, kpis, chart_fat, fat_mensal)
-        st.download_button("Download do PDF", pdf_bytes, file_name="relatorio_diario.pdf", mime="application/pdf")
+    # O PDF é gerado em segundo plano; fica pronto para download na próxima atualização
+    status_pdf, conteudo_pdf = status_relatorio(inicio, fim, filiais_usuario())
+    if status_pdf == 'pronto':
+        st.download_button("⬇️ Baixar Relatório em PDF", conteudo_pdf, file_name="relatorio_diario.pdf", mime="application/pdf")
+    elif status_pdf == 'gerando':
+        st.info("Gerando o relatório em PDF...")
+        st.button("🔄 Verificar relatório", key="btn_verificar_pdf")
+    else:
+        if status_pdf == 'falhou':
+            st.error(f"Não foi possível gerar o PDF: {conteudo_pdf}")
+        if st.button("📄 Gerar Relatório em PDF"):
+            solicitar_relatorio(inicio, fim, filiais_usuario())
+            st.rerun()
 
     if perfil == "admin":
         st.divider()
@@ -431,19 +489,27 @@ def dashboard_diario(perfil):
 
 # ========== Dashboards Temáticos ==========
 
+@cronometrado()
 def dashboard_clientes():
+    inicio, fim = periodo_selecionado()
     st.title("👥 Dashboard de Clientes")
-    df = get_sales()
-    if df.empty:
+    clientes = indicadores('clientes', inicio, fim, filiais_usuario(), modo_aproximado())
+    if clientes.clientes_unicos == 0:
         st.warning("Nenhum dado disponível.")
         return
-    st.metric("Clientes Únicos", df['parceiro'].nunique())
-    st.metric("Novos Clientes (estimado)", df['parceiro'].value_counts().loc[lambda x: x == 1].count())
+    col1, col2 = st.columns(2)
+    col1.metric(_rotulo_aproximado("Clientes Únicos"), clientes.clientes_unicos)
+    col2.metric("Novos Clientes", clientes.novos)
     st.subheader("Novos Clientes por Data")
-    novos = df.groupby('data_competencia')['parceiro'].nunique()
-    st.line_chart(novos)
+    st.line_chart(clientes.novos_por_dia)
+    st.subheader("Clientes Ativos por Data")
+    st.line_chart(clientes.ativos_por_dia)
     st.subheader("Top Clientes")
-    st.bar_chart(df.groupby('parceiro')['valor'].sum().sort_values(ascending=False).head(10))
+    st.bar_chart(clientes.top_clientes)
+    st.subheader("Recência (dias desde a última compra)")
+    st.bar_chart(clientes.recencia['clientes'])
+    st.subheader("Maiores Clientes (todo o histórico)")
+    st.dataframe(clientes.top_historico, use_container_width=True)
 
 
 def dashboard_produtos():
@@ -464,40 +530,58 @@ def dashboard_localizacao():
     st.warning("Colunas de localização não encontradas no banco de dados.")
 
 
+@cronometrado()
 def dashboard_temporal():
+    inicio, fim = periodo_selecionado()
     st.title("📅 Dashboard Temporal")
-    df = get_sales()
-    if df.empty:
+    temporal = indicadores('temporal', inicio, fim, filiais_usuario(), modo_aproximado())
+    if temporal.diario.empty or not temporal.diario['valor'].any():
         st.warning("Nenhum dado disponível.")
         return
+    diario = temporal.diario
     st.subheader("Vendas por Dia")
-    vendas_dia = df.groupby('data_competencia')['valor'].sum()
-    st.line_chart(vendas_dia)
+    st.line_chart(diario[['valor', 'media_7d', 'media_30d']].rename(
+        columns={'valor': 'Dia', 'media_7d': 'Média 7 dias', 'media_30d': 'Média 30 dias'}
+    ))
+    st.subheader("Faturamento Acumulado")
+    st.area_chart(diario['acumulado'])
+    st.subheader("Vendas por Semana")
+    st.bar_chart(temporal.semanal['valor'])
     st.subheader("Vendas por Mês")
-    df['mes'] = pd.to_datetime(df['data_competencia'], errors='coerce').dt.to_period('M')
-    vendas_mes = df.groupby('mes')['valor'].sum()
-    st.bar_chart(vendas_mes)
-
-
+    mensal = temporal.mensal
+    grafico = mensal[['valor', 'meta']].rename(columns={'valor': 'Faturamento', 'meta': 'Meta'})
+    grafico.index = grafico.index.astype(str)
+    st.bar_chart(grafico)
+    tabela = mensal[['valor', 'variacao_anterior', 'ano_anterior', 'variacao_ano', 'meta']].copy()
+    tabela.index = tabela.index.astype(str)
+    tabela.columns = ['Faturamento', 'vs. mês anterior', 'Ano anterior', 'vs. ano anterior', 'Meta']
+    st.dataframe(
+        tabela.style.format({
+            'Faturamento': 'R$ {:,.2f}', 'Ano anterior': 'R$ {:,.2f}', 'Meta': 'R$ {:,.2f}',
+            'vs. mês anterior': '{:+.1%}', 'vs. ano anterior': '{:+.1%}',
+        }, na_rep='—'),
+        use_container_width=True
+    )
+
+
+@cronometrado()
 def dashboard_devolucoes():
+    inicio, fim = periodo_selecionado()
     st.markdown("""
     <h1 style='text-align: center; margin-bottom: 0;'>↩️ Dashboard de Devoluções</h1>
     <p style='text-align: center; color: #888; margin-top: 0;'>Acompanhe devoluções e cancelamentos</p>
     """, unsafe_allow_html=True)
     st.divider()
-    df = get_sales()
-    if df.empty:
+    devolucoes = indicadores('devolucoes', inicio, fim, filiais_usuario())
+    if devolucoes.linhas_analisadas == 0:
         st.warning("Nenhum dado disponível.")
         return
-    # Considera devolução se quantidade negativa ou operação contém DEVOLUCAO
-    df['is_devolucao'] = (pd.to_numeric(df['quantidade'], errors='coerce').fillna(0) < 0) | (df['operacao'].str.upper().str.contains('DEVOLUCAO'))
-    df_dev = df[df['is_devolucao']]
     k1, k2 = st.columns(2)
-    k1.metric("Total de Devoluções", len(df_dev))
-    k2.metric("Valor Devolvido", f"R$ {pd.to_numeric(df_dev['valor'], errors='coerce').fillna(0).sum():,.2f}")
+    k1.metric("Total de Devoluções", devolucoes.quantidade)
+    k2.metric("Valor Devolvido", f"R$ {devolucoes.valor:,.2f}")
     st.divider()
     st.markdown("<h4>Devoluções ao Longo do Tempo</h4>", unsafe_allow_html=True)
-    devolucoes_tempo = df_dev.groupby('data_competencia')['valor'].sum().reset_index()
+    devolucoes_tempo = devolucoes.por_dia.reset_index()
     if not devolucoes_tempo.empty:
         chart = alt.Chart(devolucoes_tempo).mark_line(point=True, color='red').encode(
             x=alt.X('data_competencia:T', title='Data'),
@@ -506,58 +590,63 @@ def dashboard_devolucoes():
         st.altair_chart(chart, use_container_width=True)
     st.divider()
     st.markdown("<h4>Top Clientes que Devolvem</h4>", unsafe_allow_html=True)
-    top_dev = df_dev.groupby('parceiro')['valor'].sum().sort_values(ascending=False).head(10).reset_index()
+    top_dev = devolucoes.top_clientes.reset_index()
     st.dataframe(top_dev, use_container_width=True)
 
 # Dashboard de Transportadoras
 
+@cronometrado()
 def dashboard_transportadoras():
+    inicio, fim = periodo_selecionado()
     st.markdown("""
     <h1 style='text-align: center; margin-bottom: 0;'>🚚 Dashboard de Transportadoras</h1>
     <p style='text-align: center; color: #888; margin-top: 0;'>Acompanhe o desempenho das transportadoras</p>
     """, unsafe_allow_html=True)
     st.divider()
-    df = get_sales()
-    if df.empty or 'Transportadora' not in df.columns:
+    transportadoras = indicadores('transportadoras', inicio, fim, filiais_usuario())
+    if transportadoras.por_valor.empty:
         st.warning("Nenhum dado disponível.")
         return
-    top_transp = df.groupby('Transportadora')['valor'].sum().sort_values(ascending=False).head(10).reset_index()
     st.markdown("<h4>Top Transportadoras por Valor</h4>", unsafe_allow_html=True)
-    st.bar_chart(top_transp.set_index('Transportadora'))
+    st.bar_chart(serie_ranking(transportadoras.por_valor))
+    st.dataframe(transportadoras.por_valor, use_container_width=True, hide_index=True)
     st.divider()
     st.markdown("<h4>Quantidade de Entregas por Transportadora</h4>", unsafe_allow_html=True)
-    entregas = df['Transportadora'].value_counts().head(10)
-    st.bar_chart(entregas)
+    st.bar_chart(serie_ranking(transportadoras.por_entregas))
 
 # Dashboard de Condição de Pagamento
 
+@cronometrado()
 def dashboard_condicao_pagamento():
+    inicio, fim = periodo_selecionado()
     st.markdown("""
     <h1 style='text-align: center; margin-bottom: 0;'>💳 Dashboard de Condição de Pagamento</h1>
     <p style='text-align: center; color: #888; margin-top: 0;'>Acompanhe as formas e condições de pagamento</p>
     """, unsafe_allow_html=True)
     st.divider()
-    df = get_sales()
-    if df.empty or ('tipo_da_condicao' not in df.columns and 'forma_pagamento' not in df.columns):
+    condicoes = indicadores('condicoes', inicio, fim, filiais_usuario())
+    if condicoes.por_tipo.empty:
         st.warning("Nenhum dado disponível.")
         return
+    por_tipo = condicoes.por_tipo
+    por_forma = condicoes.por_forma
     st.markdown("<h4>Distribuição por Tipo de Condição</h4>", unsafe_allow_html=True)
-    if 'tipo_da_condicao' in df.columns and df['tipo_da_condicao'].str.strip().any():
-        cond = df['tipo_da_condicao'].value_counts().reset_index()
+    if por_tipo.index.str.strip().any():
+        cond = por_tipo['linhas'].sort_values(ascending=False).reset_index()
         cond.columns = ['Tipo da Condição', 'Quantidade']
         st.bar_chart(cond.set_index('Tipo da Condição'))
     else:
         st.info("Nenhum dado para 'Tipo da Condição'.")
     st.divider()
     st.markdown("<h4>Distribuição por Forma de Pagamento</h4>", unsafe_allow_html=True)
-    if 'forma_pagamento' in df.columns and df['forma_pagamento'].str.strip().any():
-        forma = df['forma_pagamento'].value_counts().reset_index()
+    if por_forma.index.str.strip().any():
+        forma = por_forma.sort_values(ascending=False).reset_index()
         forma.columns = ['Forma de Pagamento', 'Quantidade']
         st.bar_chart(forma.set_index('Forma de Pagamento'))
     else:
         st.info("Nenhum dado para 'Forma de Pagamento'.")
     st.divider()
     st.markdown("<h4>Ticket Médio por Condição</h4>", unsafe_allow_html=True)
-    if 'tipo_da_condicao' in df.columns and df['tipo_da_condicao'].str.strip().any():
-        ticket = df.groupby('tipo_da_condicao')['valor'].mean().sort_values(ascending=False).reset_index()
-        st.dataframe(ticket, use_container_width=True) 
\ No newline at end of file
+    if por_tipo.index.str.strip().any():
+        ticket = condicoes.ticket_por_tipo.reset_index()
+        st.dataframe(ticket, use_container_width=True)
\ No newline at end of file
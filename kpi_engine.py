@@ -0,0 +1,360 @@
+# Cálculo dos indicadores dos dashboards, sem nada de Streamlit: cada dashboard só
+# desenha o que sai daqui. Os resultados ficam no cache do processo e, se alguém rodou
+# este módulo pela linha de comando (ex.: job noturno), também na pasta indicadores/ ao
+# lado do banco (data/indicadores/ com o banco padrão).
+#
+#   python kpi_engine.py                                  # período inteiro, aquece o cache em disco
+#   python kpi_engine.py --inicio 2024-01-01 --fim 2024-06-30 --saida indicadores.json
+import argparse
+import hashlib
+import json
+import math
+import pickle
+import sys
+from dataclasses import dataclass, fields
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import db_utils
+from cache_utils import em_cache
+from metricas_utils import cronometrado
+
+TAMANHO_RANKING = 10
+# Sobe quando o formato das dataclasses muda: arquivos em disco de outra versão são ignorados
+VERSAO_INDICADORES = 5
+# Modo aproximado: máximo de pontos das séries diárias desenhadas em gráficos de linha
+PONTOS_GRAFICO = 400
+
+@dataclass
+class Faturamento:
+    total: float
+    quantidade: int
+    vendas: int
+    ticket_medio: float
+    por_dia: pd.Series              # dia -> valor
+    por_mes: pd.Series              # período mensal (AAAA-MM) -> valor
+
+@dataclass
+class Clientes:
+    clientes_unicos: int
+    novos: int                      # clientes cuja primeira compra do histórico caiu no período
+    novos_por_dia: pd.Series        # dia -> clientes novos
+    ativos_por_dia: pd.Series       # dia -> clientes distintos
+    top_clientes: pd.Series         # parceiro -> valor no período, maiores primeiro
+    recencia: pd.DataFrame          # faixa de recência -> clientes, valor (situação atual da base)
+    top_historico: pd.DataFrame     # maiores clientes de todo o histórico (dimensão clientes)
+
+@dataclass
+class Vendedores:
+    por_vendedor: pd.Series         # vendedor -> valor, maiores primeiro
+    top_vendedores: pd.Series       # os TAMANHO_RANKING primeiros, com empates
+
+@dataclass
+class Produtos:
+    quantidade_por_produto: pd.Series   # codigo_produto -> quantidade (> 0)
+
+@dataclass
+class CondicoesPagamento:
+    por_tipo: pd.DataFrame          # tipo_da_condicao -> valor, linhas
+    por_forma: pd.Series            # forma_pagamento -> linhas
+    ticket_por_tipo: pd.Series      # tipo_da_condicao -> valor médio por linha
+
+@dataclass
+class Devolucoes:
+    linhas_analisadas: int          # linhas de venda do período, com ou sem devolução
+    quantidade: int
+    valor: float                    # valor devolvido, positivo
+    por_dia: pd.Series              # data -> valor devolvido
+    top_clientes: pd.Series         # parceiro -> valor devolvido
+
+@dataclass
+class Transportadoras:
+    por_valor: pd.DataFrame         # ranking (transportadora, valor, posicao), com a linha "Outros"
+    por_entregas: pd.DataFrame      # ranking (transportadora, vendas, posicao), com a linha "Outros"
+
+@dataclass
+class Temporal:
+    # Séries de db_utils.serie_temporal: valor, comparações, acumulado, médias móveis e meta
+    diario: pd.DataFrame
+    semanal: pd.DataFrame
+    mensal: pd.DataFrame
+
+@dataclass
+class IndicadoresPainel:
+    inicio: object
+    fim: object
+    versao_dados: int
+    faturamento: Faturamento
+    clientes: Clientes
+    vendedores: Vendedores
+    produtos: Produtos
+    condicoes: CondicoesPagamento
+    devolucoes: Devolucoes
+    transportadoras: Transportadoras
+    temporal: Temporal
+
+def amostrar_serie(dados, pontos=PONTOS_GRAFICO):
+    # Reduz uma série (ou DataFrame, pela primeira coluna) a "pontos" linhas com o
+    # Largest-Triangle-Three-Buckets: mantém a primeira e a última e, em cada faixa, a
+    # linha que forma o maior triângulo com as vizinhas, preservando picos e vales.
+    # As linhas mantidas não mudam de valor; séries curtas voltam inteiras.
+    total = len(dados)
+    if total <= pontos or pontos < 3:
+        return dados
+    y = np.nan_to_num(np.asarray(dados if isinstance(dados, pd.Series) else dados.iloc[:, 0], dtype='float64'))
+    x = np.arange(total, dtype='float64')
+    limites = np.linspace(1, total - 1, pontos - 1).astype(int)
+    escolhidas = [0]
+    for i in range(pontos - 2):
+        faixa = slice(limites[i], limites[i + 1])
+        seguinte = slice(limites[i + 1], limites[i + 2] if i + 2 < len(limites) else total)
+        media_x, media_y = x[seguinte].mean(), y[seguinte].mean()
+        a = escolhidas[-1]
+        area = np.abs((x[a] - media_x) * (y[faixa] - y[a]) - (x[a] - x[faixa]) * (media_y - y[a]))
+        escolhidas.append(limites[i] + int(np.argmax(area)))
+    escolhidas.append(total - 1)
+    return dados.iloc[escolhidas]
+
+def serie_ranking(ranking):
+    # Itens de um db_utils.ranking como Series (dimensão -> medida), sem a linha "Outros"
+    itens = ranking[ranking['posicao'].notna()]
+    return itens.set_index(itens.columns[0])[itens.columns[1]]
+
+# Todo cálculo recebe filiais, a restrição de acesso do usuário (None = todas as filiais),
+# e a repassa às consultas de db_utils, que filtram no SQL. Os de SECOES_APROXIMADAS
+# aceitam aproximado: contagens de distintos pelos esboços HyperLogLog
+# (db_utils.distintos_aproximados) e séries diárias reduzidas por amostrar_serie.
+
+def calcular_faturamento(inicio=None, fim=None, filiais=None, aproximado=False):
+    por_dia = db_utils.get_rollup('dia', inicio, fim, filiais)
+    total = float(por_dia['valor'].sum())
+    if aproximado:
+        vendas = db_utils.distintos_aproximados(inicio, fim, filiais)['vendas']
+    else:
+        vendas = int(por_dia['vendas'].sum())
+    serie = por_dia.set_index('dia')['valor']
+    return Faturamento(
+        total=total,
+        quantidade=int(por_dia['quantidade'].sum()),
+        vendas=vendas,
+        ticket_medio=total / max(vendas, 1),
+        por_dia=serie,
+        por_mes=serie.groupby(serie.index.to_period('M')).sum(),
+    )
+
+def calcular_clientes(inicio=None, fim=None, tamanho_ranking=TAMANHO_RANKING, filiais=None, aproximado=False):
+    novos_por_dia = db_utils.novos_clientes_por_dia(inicio, fim, filiais)
+    if aproximado:
+        # Sem ler rollup_parceiro: ativos do dia somam os distintos de cada filial
+        # (quem comprou em duas filiais no mesmo dia conta duas vezes)
+        clientes_unicos = db_utils.distintos_aproximados(inicio, fim, filiais)['clientes']
+        ativos_por_dia = amostrar_serie(db_utils.get_rollup('dia', inicio, fim, filiais).set_index('dia')['clientes'])
+    else:
+        por_parceiro = db_utils.get_rollup('parceiro', inicio, fim, filiais)
+        clientes_unicos = por_parceiro['parceiro'].nunique()
+        ativos_por_dia = por_parceiro.groupby('dia')['parceiro'].nunique()
+    return Clientes(
+        clientes_unicos=clientes_unicos,
+        novos=int(novos_por_dia.sum()),
+        novos_por_dia=amostrar_serie(novos_por_dia) if aproximado else novos_por_dia,
+        ativos_por_dia=ativos_por_dia,
+        top_clientes=serie_ranking(
+            db_utils.ranking('parceiro', inicio, fim, tamanho_ranking, outros=False, filiais=filiais)
+        ),
+        recencia=db_utils.clientes_por_recencia(filiais=filiais),
+        top_historico=db_utils.ranking_clientes(tamanho_ranking, filiais=filiais),
+    )
+
+def calcular_vendedores(inicio=None, fim=None, tamanho_ranking=TAMANHO_RANKING, filiais=None):
+    por_vendedor = db_utils.get_rollup('vendedor', inicio, fim, filiais)
+    return Vendedores(
+        por_vendedor=por_vendedor.groupby('vendedor')['valor'].sum().sort_values(ascending=False),
+        top_vendedores=serie_ranking(
+            db_utils.ranking('vendedor', inicio, fim, tamanho_ranking, outros=False, filiais=filiais)
+        ),
+    )
+
+def calcular_produtos(inicio=None, fim=None, filiais=None):
+    quantidade = db_utils.get_rollup('produto', inicio, fim, filiais).groupby('codigo_produto')['quantidade'].sum()
+    return Produtos(quantidade_por_produto=quantidade[quantidade > 0])
+
+def calcular_condicoes(inicio=None, fim=None, filiais=None):
+    por_condicao = db_utils.get_rollup('condicao', inicio, fim, filiais)
+    por_tipo = por_condicao.groupby('tipo_da_condicao')[['valor', 'linhas']].sum()
+    return CondicoesPagamento(
+        por_tipo=por_tipo,
+        por_forma=por_condicao.groupby('forma_pagamento')['linhas'].sum(),
+        ticket_por_tipo=(por_tipo['valor'] / por_tipo['linhas']).rename('valor').sort_values(ascending=False),
+    )
+
+def calcular_devolucoes(inicio=None, fim=None, tamanho_ranking=TAMANHO_RANKING, filiais=None):
+    # Só linhas com devolucao = 1, lidas pelo índice parcial; valores negativos no banco
+    # aparecem aqui como valor devolvido (positivo)
+    por_dia = db_utils.consultar_vendas(
+        inicio=inicio, fim=fim, filiais=filiais, devolucao=True, agrupar_por='data_competencia',
+        agregacoes={'valor': ('sum', 'valor'), 'linhas': ('count', '*')}
+    )
+    top = db_utils.consultar_vendas(
+        inicio=inicio, fim=fim, filiais=filiais, devolucao=True, agrupar_por='parceiro',
+        agregacoes={'valor': ('sum', 'valor')}, ordenar_por='valor', limite=tamanho_ranking
+    )
+    return Devolucoes(
+        linhas_analisadas=int(db_utils.get_rollup('dia', inicio, fim, filiais)['linhas'].sum()),
+        quantidade=int(por_dia['linhas'].sum()),
+        valor=abs(float(por_dia['valor'].sum())),
+        por_dia=-por_dia.set_index('data_competencia')['valor'],
+        top_clientes=-top.set_index('parceiro')['valor'],
+    )
+
+def calcular_transportadoras(inicio=None, fim=None, tamanho_ranking=TAMANHO_RANKING, filiais=None):
+    return Transportadoras(
+        por_valor=db_utils.ranking('transportadora', inicio, fim, tamanho_ranking, filiais=filiais),
+        por_entregas=db_utils.ranking('transportadora', inicio, fim, tamanho_ranking, medida='vendas', filiais=filiais),
+    )
+
+def calcular_temporal(inicio=None, fim=None, filiais=None, aproximado=False):
+    temporal = Temporal(**{
+        campo: db_utils.serie_temporal(granularidade, inicio, fim, filiais=filiais)
+        for campo, granularidade in (('diario', 'dia'), ('semanal', 'semana'), ('mensal', 'mes'))
+    })
+    if aproximado:
+        temporal.diario = amostrar_serie(temporal.diario)
+    return temporal
+
+# Seções de IndicadoresPainel e a função que calcula cada uma
+CALCULOS = {
+    'faturamento': calcular_faturamento,
+    'clientes': calcular_clientes,
+    'vendedores': calcular_vendedores,
+    'produtos': calcular_produtos,
+    'condicoes': calcular_condicoes,
+    'devolucoes': calcular_devolucoes,
+    'transportadoras': calcular_transportadoras,
+    'temporal': calcular_temporal,
+}
+# Seções que têm modo aproximado; nas demais ele é ignorado
+SECOES_APROXIMADAS = ('faturamento', 'clientes', 'temporal')
+
+def _normalizar_data(data):
+    return None if data is None else pd.Timestamp(data).date()
+
+def diretorio_indicadores():
+    # Indicadores pré-calculados, um arquivo por (banco, versão dos dados, período), ao
+    # lado do banco como db_utils.diretorio_arquivo: não depende de onde o processo começou
+    return Path(db_utils.DB_FILE).parent / "indicadores"
+
+def _arquivo_indicadores(inicio, fim, versao):
+    banco = hashlib.sha1(str(Path(db_utils.DB_FILE).resolve()).encode()).hexdigest()[:8]
+    periodo = f"{inicio or 'inicio'}_{fim or 'fim'}"
+    return diretorio_indicadores() / f"{banco}_v{versao}_{periodo}_i{VERSAO_INDICADORES}.pkl"
+
+def _painel_em_disco(inicio, fim, versao):
+    # Painel pré-calculado pela linha de comando, se for da versão atual dos dados
+    arquivo = _arquivo_indicadores(inicio, fim, versao)
+    if not arquivo.exists():
+        return None
+    try:
+        with open(arquivo, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+
+@em_cache(db_utils.token_dados)
+@cronometrado()
+def indicadores(secao, inicio=None, fim=None, filiais=None, aproximado=False):
+    # Uma seção do painel (ver CALCULOS), de todas as filiais ou só das informadas (as
+    # filiais fazem parte da chave do cache), exata ou aproximada (SECOES_APROXIMADAS).
+    # Cada chamada recebe uma cópia do que está no cache (ver cache_utils._copiar).
+    if secao not in CALCULOS:
+        raise ValueError(f"Seção de indicadores desconhecida: {secao}")
+    inicio, fim = _normalizar_data(inicio), _normalizar_data(fim)
+    aproximado = aproximado and secao in SECOES_APROXIMADAS
+    # O cache em disco só guarda o painel exato de todas as filiais
+    if filiais is None and not aproximado:
+        painel = _painel_em_disco(inicio, fim, db_utils.versao_dados())
+        if painel is not None:
+            return getattr(painel, secao)
+    if aproximado:
+        return CALCULOS[secao](inicio, fim, filiais=filiais, aproximado=True)
+    return CALCULOS[secao](inicio, fim, filiais=filiais)
+
+def indicadores_painel(inicio=None, fim=None):
+    inicio, fim = _normalizar_data(inicio), _normalizar_data(fim)
+    return IndicadoresPainel(
+        inicio=inicio, fim=fim, versao_dados=db_utils.versao_dados(),
+        **{secao: indicadores(secao, inicio, fim) for secao in CALCULOS}
+    )
+
+def salvar_indicadores(painel):
+    # Grava no cache em disco e apaga os arquivos de versões anteriores do mesmo banco
+    arquivo = _arquivo_indicadores(painel.inicio, painel.fim, painel.versao_dados)
+    arquivo.parent.mkdir(parents=True, exist_ok=True)
+    prefixo = arquivo.name.split('_v')[0]
+    for antigo in arquivo.parent.glob(f"{prefixo}_v*.pkl"):
+        if not (antigo.name.startswith(f"{prefixo}_v{painel.versao_dados}_")
+                and antigo.name.endswith(f"_i{VERSAO_INDICADORES}.pkl")):
+            antigo.unlink(missing_ok=True)
+    temporario = arquivo.with_suffix('.tmp')
+    with open(temporario, 'wb') as f:
+        pickle.dump(painel, f)
+    temporario.replace(arquivo)
+    return arquivo
+
+def _chave_json(chave):
+    if isinstance(chave, pd.Timestamp) and chave == chave.normalize():
+        return chave.date().isoformat()
+    return str(chave)
+
+def _para_json(valor):
+    if isinstance(valor, pd.Series):
+        return {_chave_json(k): _para_json(v) for k, v in valor.items()}
+    if isinstance(valor, pd.DataFrame):
+        return {_chave_json(k): _para_json(linha) for k, linha in valor.iterrows()}
+    if hasattr(valor, '__dataclass_fields__'):
+        return {campo.name: _para_json(getattr(valor, campo.name)) for campo in fields(valor)}
+    if hasattr(valor, 'item'):
+        valor = valor.item()
+    # NaN, infinito, NaT e pd.NA não existem em JSON: viram null
+    if isinstance(valor, float) and not math.isfinite(valor):
+        return None
+    if pd.api.types.is_scalar(valor) and pd.isna(valor):
+        return None
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return valor
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula os indicadores dos dashboards para um período.")
+    parser.add_argument('--inicio', help="data inicial (AAAA-MM-DD); padrão: primeiro dia com vendas")
+    parser.add_argument('--fim', help="data final (AAAA-MM-DD); padrão: último dia com vendas")
+    parser.add_argument('--saida', help="grava os indicadores em JSON neste arquivo em vez do cache em disco")
+    parser.add_argument('--db', default=str(db_utils.DB_FILE), help="arquivo do banco SQLite")
+    args = parser.parse_args(argv)
+
+    db_utils.configurar_db(args.db)
+    db_utils.init_db()
+    intervalo = db_utils.intervalo_datas()
+    if intervalo is None:
+        print("Banco sem vendas.")
+        return 1
+    # Sem datas, usa o período que a barra lateral mostra ao abrir o app
+    inicio = _normalizar_data(args.inicio) or intervalo[0]
+    fim = _normalizar_data(args.fim) or intervalo[1]
+    painel = indicadores_painel(inicio, fim)
+    if args.saida:
+        Path(args.saida).write_text(json.dumps(_para_json(painel), indent=2, ensure_ascii=False, allow_nan=False))
+        destino = args.saida
+    else:
+        destino = salvar_indicadores(painel)
+    print(
+        f"{inicio} a {fim}: faturamento R$ {painel.faturamento.total:,.2f}, "
+        f"{painel.clientes.clientes_unicos:,} clientes, {painel.devolucoes.quantidade:,} devoluções -> {destino}"
+    )
+    return 0
+
+if __name__ == '__main__':
+    # Roda pelo módulo importado, para o pickle gravar as classes como kpi_engine.* e não __main__.*
+    import kpi_engine
+    sys.exit(kpi_engine.main())
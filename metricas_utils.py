@@ -0,0 +1,158 @@
+import functools
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Últimas medições guardadas por span; as mais antigas são descartadas
+TAMANHO_BUFFER = 2048
+# Arquivo no formato texto do Prometheus (ex.: para o textfile collector do node_exporter).
+# Fica desligado até ativar_exportacao: scripts, benchmarks e testes só medem, sem gravar.
+ARQUIVO_PROMETHEUS = None
+# Intervalo mínimo entre duas gravações automáticas do arquivo
+INTERVALO_EXPORTACAO = 15.0
+QUANTIS = (0.5, 0.95, 0.99)
+
+class Span:
+    # Medição em andamento; quem mede pode preencher linhas e bytes
+    __slots__ = ('nome', 'linhas', 'bytes')
+
+    def __init__(self, nome):
+        self.nome = nome
+        self.linhas = None
+        self.bytes = None
+
+class RegistroSpans:
+    # Buffer circular por span com duração, linhas e bytes de cada chamada
+
+    def __init__(self, tamanho=TAMANHO_BUFFER):
+        self.tamanho = tamanho
+        self._spans = {}
+        self._totais = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, nome, segundos, linhas=None, bytes_=None):
+        with self._lock:
+            if nome not in self._spans:
+                self._spans[nome] = deque(maxlen=self.tamanho)
+                self._totais[nome] = [0, 0.0]
+            self._spans[nome].append((segundos, linhas, bytes_))
+            # Contagem e soma desde o início, como o Prometheus espera de um summary
+            self._totais[nome][0] += 1
+            self._totais[nome][1] += segundos
+
+    def limpar(self):
+        with self._lock:
+            self._spans.clear()
+            self._totais.clear()
+
+    def resumo(self):
+        # Uma linha por span: chamadas, quantis da duração (ms), linhas e bytes médios
+        with self._lock:
+            copias = {nome: list(medicoes) for nome, medicoes in self._spans.items()}
+            totais = {nome: tuple(t) for nome, t in self._totais.items()}
+        linhas = []
+        for nome, medicoes in sorted(copias.items()):
+            duracoes = np.array([m[0] for m in medicoes]) * 1000
+            contagens = [m[1] for m in medicoes if m[1] is not None]
+            tamanhos = [m[2] for m in medicoes if m[2] is not None]
+            p50, p95, p99 = np.percentile(duracoes, [q * 100 for q in QUANTIS])
+            linhas.append({
+                'span': nome,
+                'chamadas': totais[nome][0],
+                'p50_ms': p50,
+                'p95_ms': p95,
+                'p99_ms': p99,
+                'max_ms': duracoes.max(),
+                'linhas_media': np.mean(contagens) if contagens else None,
+                'bytes_media': np.mean(tamanhos) if tamanhos else None,
+            })
+        return pd.DataFrame(linhas, columns=[
+            'span', 'chamadas', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'linhas_media', 'bytes_media'
+        ])
+
+    def texto_prometheus(self):
+        with self._lock:
+            copias = {nome: [m[0] for m in medicoes] for nome, medicoes in self._spans.items()}
+            totais = {nome: tuple(t) for nome, t in self._totais.items()}
+        saida = [
+            "# HELP dashboard_span_seconds Duração das etapas do dashboard (últimas medições de cada span).",
+            "# TYPE dashboard_span_seconds summary",
+        ]
+        for nome, duracoes in sorted(copias.items()):
+            rotulo = nome.replace('\\', '\\\\').replace('"', '\\"')
+            for quantil, valor in zip(QUANTIS, np.percentile(duracoes, [q * 100 for q in QUANTIS])):
+                saida.append(f'dashboard_span_seconds{{span="{rotulo}",quantile="{quantil}"}} {valor:.6f}')
+            saida.append(f'dashboard_span_seconds_sum{{span="{rotulo}"}} {totais[nome][1]:.6f}')
+            saida.append(f'dashboard_span_seconds_count{{span="{rotulo}"}} {totais[nome][0]}')
+        return "\n".join(saida) + "\n"
+
+REGISTRO = RegistroSpans()
+_ultima_exportacao = 0.0
+
+def ativar_exportacao(caminho):
+    # Liga a gravação automática (a cada INTERVALO_EXPORTACAO) no arquivo informado
+    global ARQUIVO_PROMETHEUS
+    ARQUIVO_PROMETHEUS = Path(caminho)
+
+def exportar_prometheus(caminho=None):
+    # Grava o arquivo de forma atômica, para o coletor nunca ler um arquivo pela metade
+    global _ultima_exportacao
+    caminho = caminho or ARQUIVO_PROMETHEUS
+    if caminho is None:
+        raise ValueError("Exportação de métricas não ativada (ver ativar_exportacao)")
+    caminho = Path(caminho)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=caminho.parent, prefix='.metricas_', suffix='.tmp')
+    with os.fdopen(descritor, 'w') as f:
+        f.write(REGISTRO.texto_prometheus())
+    os.replace(temporario, caminho)
+    _ultima_exportacao = time.monotonic()
+    return caminho
+
+def _exportar_se_vencido():
+    if ARQUIVO_PROMETHEUS is not None and time.monotonic() - _ultima_exportacao >= INTERVALO_EXPORTACAO:
+        try:
+            exportar_prometheus()
+        except OSError:
+            pass
+
+def _medidas_do_resultado(resultado):
+    # Linhas e bytes de um DataFrame (memória rasa, para não custar caro) ou do resumo da ingestão
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        # Series.memory_usage já devolve o total; DataFrame devolve um valor por coluna
+        return len(resultado), int(np.sum(resultado.memory_usage(deep=False)))
+    if isinstance(resultado, dict) and 'inseridos' in resultado:
+        return resultado['inseridos'], resultado.get('bytes')
+    return None, None
+
+@contextmanager
+def medir(nome):
+    # with medir('etapa') as span: ...; span.linhas = len(df)
+    span = Span(nome)
+    inicio = time.perf_counter()
+    try:
+        yield span
+    finally:
+        REGISTRO.registrar(nome, time.perf_counter() - inicio, span.linhas, span.bytes)
+        _exportar_se_vencido()
+
+def cronometrado(nome=None):
+    # Decorador: mede cada chamada; DataFrames e resumos de ingestão devolvidos
+    # preenchem linhas e bytes automaticamente
+    def decorador(func):
+        rotulo = nome or func.__name__
+        @functools.wraps(func)
+        def envoltorio(*args, **kwargs):
+            with medir(rotulo) as span:
+                resultado = func(*args, **kwargs)
+                span.linhas, span.bytes = _medidas_do_resultado(resultado)
+            return resultado
+        return envoltorio
+    return decorador
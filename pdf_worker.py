@@ -0,0 +1,132 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+
+from db_utils import consultar_vendas, token_dados
+from kpi_engine import indicadores
+from metricas_utils import cronometrado
+
+# Relatórios gerados ao mesmo tempo; cada um usa só a API orientada a objetos do
+# matplotlib (Figure + PdfPages), sem pyplot, então podem rodar em threads
+WORKERS_PDF = 2
+COLUNAS_TABELA = ['data_competencia', 'numero_venda', 'parceiro', 'valor', 'quantidade', 'vendedor', 'forma_pagamento', 'filial']
+LINHAS_TABELA = 30
+TAMANHO_PAGINA = (8.27, 11.69)  # A4 em polegadas
+# PDFs prontos guardados em memória (os mais antigos saem primeiro)
+LIMITE_RELATORIOS = 20
+
+_executor = None
+_lock = threading.Lock()
+# (token dos dados, inicio, fim, filiais) -> Future com os bytes do PDF
+_relatorios = {}
+
+def _moeda(valor):
+    return f"R$ {valor:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+
+def _pagina_resumo(pdf, faturamento, clientes, inicio, fim):
+    fig = Figure(figsize=TAMANHO_PAGINA)
+    fig.suptitle("Relatório Diário de Vendas", fontsize=18, fontweight='bold', y=0.97)
+    periodo = f"{pd.Timestamp(inicio):%d/%m/%Y} a {pd.Timestamp(fim):%d/%m/%Y}" if inicio and fim else "Todo o período"
+    fig.text(0.5, 0.935, periodo, ha='center', fontsize=10, color='#555')
+    kpis = [
+        ("Total de Vendas", f"{faturamento.vendas:,}".replace(',', '.')),
+        ("Clientes Únicos", f"{clientes.clientes_unicos:,}".replace(',', '.')),
+        ("Ticket Médio", _moeda(faturamento.ticket_medio)),
+        ("Total Vendido", _moeda(faturamento.total)),
+    ]
+    for i, (titulo, valor) in enumerate(kpis):
+        x = 0.14 + i * 0.24
+        fig.text(x, 0.885, titulo, ha='center', fontsize=9, color='#555')
+        fig.text(x, 0.86, valor, ha='center', fontsize=12, fontweight='bold')
+
+    ax = fig.add_axes([0.3, 0.5, 0.62, 0.3])
+    top = clientes.top_clientes.sort_values()
+    ax.barh([str(p) for p in top.index], top.values, color='#198754')
+    ax.set_title("Top 10 Clientes", loc='left', fontsize=12)
+    ax.tick_params(labelsize=8)
+
+    ax = fig.add_axes([0.1, 0.08, 0.82, 0.32])
+    por_mes = faturamento.por_mes
+    ax.plot([str(p) for p in por_mes.index], por_mes.values, marker='o', color='#0d6efd')
+    ax.set_title("Vendas ao Longo do Tempo (por mês)", loc='left', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45, labelsize=8)
+    ax.tick_params(axis='y', labelsize=8)
+    ax.grid(alpha=0.3)
+    pdf.savefig(fig)
+
+def _pagina_tabela(pdf, vendas):
+    fig = Figure(figsize=TAMANHO_PAGINA)
+    fig.suptitle("Tabela de Vendas Filtradas", fontsize=14, fontweight='bold', y=0.97)
+    ax = fig.add_axes([0.03, 0.08, 0.94, 0.85])
+    ax.axis('off')
+    if vendas.empty:
+        ax.text(0.5, 0.5, "Nenhuma venda no período.", ha='center')
+    else:
+        tabela = vendas.copy()
+        tabela['data_competencia'] = tabela['data_competencia'].dt.strftime('%d/%m/%Y')
+        tabela['valor'] = tabela['valor'].map(_moeda)
+        texto = tabela.astype(str).map(lambda v: v if len(v) <= 22 else v[:21] + '…')
+        grade = ax.table(cellText=texto.values, colLabels=list(tabela.columns), loc='upper center', cellLoc='left')
+        grade.auto_set_font_size(False)
+        grade.set_fontsize(6)
+        grade.scale(1, 1.3)
+    fig.text(0.5, 0.04, f"Exibindo as {LINHAS_TABELA} primeiras linhas.", ha='center', fontsize=8, color='#888')
+    pdf.savefig(fig)
+
+@cronometrado()
+def gerar_pdf_dashboard_diario(inicio=None, fim=None, filiais=None):
+    # Monta o PDF do dashboard diário a partir dos indicadores do período (só das filiais
+    # informadas, se houver restrição); devolve os bytes
+    faturamento = indicadores('faturamento', inicio, fim, filiais)
+    clientes = indicadores('clientes', inicio, fim, filiais)
+    vendas = consultar_vendas(colunas=COLUNAS_TABELA, inicio=inicio, fim=fim, filiais=filiais, limite=LINHAS_TABELA)
+    saida = io.BytesIO()
+    with PdfPages(saida) as pdf:
+        _pagina_resumo(pdf, faturamento, clientes, inicio, fim)
+        _pagina_tabela(pdf, vendas)
+        info = pdf.infodict()
+        info['Title'] = "Relatório Diário de Vendas"
+        info['CreationDate'] = datetime.now()
+    return saida.getvalue()
+
+def _iniciar_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS_PDF, thread_name_prefix='pdf')
+    return _executor
+
+def _chave(inicio, fim, filiais):
+    normalizar = lambda d: None if d is None else pd.Timestamp(d).date()
+    return token_dados(), normalizar(inicio), normalizar(fim), None if filiais is None else tuple(sorted(filiais))
+
+def solicitar_relatorio(inicio=None, fim=None, filiais=None):
+    # Coloca o PDF do período na fila, se ainda não existir um para a versão atual dos dados
+    chave = _chave(inicio, fim, filiais)
+    with _lock:
+        # Relatórios de versões antigas dos dados não serão mais pedidos
+        for antiga in [c for c in _relatorios if c[0] != chave[0]]:
+            _relatorios.pop(antiga)
+        futuro = _relatorios.get(chave)
+        if futuro is None or (futuro.done() and futuro.exception() is not None):
+            _relatorios[chave] = _iniciar_executor().submit(gerar_pdf_dashboard_diario, *chave[1:])
+        prontos = [c for c, f in _relatorios.items() if f.done()]
+        for antiga in prontos[:max(0, len(_relatorios) - LIMITE_RELATORIOS)]:
+            _relatorios.pop(antiga)
+
+def status_relatorio(inicio=None, fim=None, filiais=None):
+    # Devolve (status, conteudo): (None, None) se não foi pedido, ('gerando', None),
+    # ('pronto', bytes do PDF) ou ('falhou', mensagem de erro)
+    with _lock:
+        futuro = _relatorios.get(_chave(inicio, fim, filiais))
+    if futuro is None:
+        return None, None
+    if not futuro.done():
+        return 'gerando', None
+    if futuro.exception() is not None:
+        return 'falhou', str(futuro.exception())
+    return 'pronto', futuro.result()
@@ -0,0 +1,27 @@
+import pytest
+
+import db_utils
+
+@pytest.fixture
+def banco(tmp_path):
+    anterior = db_utils.DB_FILE
+    db_utils.configurar_db(tmp_path / 'vendas.db')
+    db_utils.init_db()
+    yield
+    db_utils.configurar_db(anterior)
+
+@pytest.mark.parametrize('filiais', [('02',), ('02', '03')])
+@pytest.mark.parametrize('agrupar_por', ['parceiro', 'data_competencia'])
+def test_devolucoes_de_usuario_restrito_usam_indice_parcial(banco, filiais, agrupar_por):
+    sql, parametros = db_utils.montar_consulta_vendas(
+        inicio='2024-01-01', fim='2024-12-31', devolucao=True, agrupar_por=agrupar_por,
+        agregacoes={'valor': ('sum', 'valor')}, filiais=filiais
+    )
+    with db_utils.conexao_leitura() as conn:
+        plano = ' '.join(linha[3] for linha in conn.execute(f"EXPLAIN QUERY PLAN {sql}", parametros))
+    assert 'ix_vendas_devolucao_filial' in plano
+
+def test_devolucoes_sem_filial_permitida(banco):
+    sql, parametros = db_utils.montar_consulta_vendas(devolucao=True, agrupar_por='parceiro', filiais=[])
+    with db_utils.conexao_leitura() as conn:
+        assert conn.execute(sql, parametros).fetchall() == []
@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+
+from csv_utils import nomes_padronizados, padronizar_colunas
+from db_utils import preparar_vendas
+
+# Alias e nome padrão que caem na mesma coluna, nas duas ordens
+CABECALHOS_REPETIDOS = [
+    ['Qtd', 'Quantidade'],
+    ['Quantidade', 'Qtd'],
+    ['Tipo Condição', 'Tipo da Condição'],
+    ['Tipo da Condição', 'Tipo Condição'],
+]
+
+@pytest.mark.parametrize('extras', CABECALHOS_REPETIDOS)
+def test_cabecalho_sem_colunas_repetidas(extras):
+    nomes = nomes_padronizados(['Data Competência', 'Nº Venda', 'Parceiro', 'Valor'] + extras)
+    assert len(nomes) == len(set(nomes))
+    # A primeira das duas fica com o nome padrão
+    assert nomes[4] in ('quantidade', 'tipo_da_condicao')
+
+@pytest.mark.parametrize('extras', CABECALHOS_REPETIDOS)
+def test_preparar_vendas_com_alias_e_nome_padrao(extras):
+    cabecalho = ['Data Competência', 'Nº Venda', 'Parceiro', 'Valor'] + extras
+    df = pd.DataFrame([['01/02/2024', '10', 'CLIENTE', '1.234,50', '3', 'A VISTA']], columns=cabecalho)
+    validas, rejeitados = preparar_vendas(padronizar_colunas(df))
+    assert rejeitados.empty
+    assert validas['valor'].tolist() == [1234.5]
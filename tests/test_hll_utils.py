@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+import hll_utils
+
+ENSAIOS = 30
+
+def test_esboco_vazio_estima_zero():
+    assert hll_utils.estimar(hll_utils.vazio()) == 0
+
+# De 0,5 a 6 vezes o número de registradores, cobrindo a antiga troca para a contagem linear
+@pytest.mark.parametrize('fator', [0.5, 1, 2, 2.5, 2.6, 3, 4, 6])
+def test_erro_dentro_do_limite(fator):
+    n = int(fator * hll_utils.REGISTRADORES)
+    rng = np.random.default_rng(n)
+    valores = rng.integers(0, 2 ** 62, n * ENSAIOS)
+    registros = hll_utils.esbocos(np.repeat(np.arange(ENSAIOS), n), valores, ENSAIOS)
+    erros = np.array([hll_utils.estimar(r) / n - 1 for r in registros])
+    # Sem viés: a média de ENSAIOS estimativas fica bem dentro de um erro padrão
+    assert abs(erros.mean()) < 0.5 * hll_utils.ERRO_PADRAO
+    assert np.mean(np.abs(erros) <= hll_utils.LIMITE_ERRO_95) >= 0.85
@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+import db_utils
+
+@pytest.fixture
+def banco_original(tmp_path):
+    # Esquema da primeira versão, sem código do produto: uma venda com três itens
+    caminho = tmp_path / 'vendas.db'
+    conn = sqlite3.connect(caminho)
+    conn.execute("""
+        CREATE TABLE vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_competencia TEXT,
+            numero_venda TEXT,
+            parceiro TEXT,
+            valor REAL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO vendas (data_competencia, numero_venda, parceiro, valor) VALUES (?, ?, ?, ?)",
+        [('2024-02-01', '10', 'CLIENTE', 10.0), ('2024-02-01', '10', 'CLIENTE', 25.0),
+         ('2024-02-01', '10', 'CLIENTE', 7.5)],
+    )
+    conn.commit()
+    conn.close()
+    anterior = db_utils.DB_FILE
+    db_utils.configurar_db(caminho)
+    yield caminho
+    db_utils.configurar_db(anterior)
+
+def test_migracoes_preservam_itens_da_mesma_venda(banco_original):
+    db_utils.init_db()
+    with db_utils.conexao_leitura() as conn:
+        linhas, total = conn.execute("SELECT COUNT(*), SUM(valor) FROM vendas").fetchone()
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    assert (linhas, total) == (3, 42.5)
+    assert versao == len(db_utils.MIGRACOES)
+    # Os agregados diários são recalculados a partir das mesmas linhas
+    assert db_utils.get_rollup('dia')['valor'].sum() == 42.5
@@ -0,0 +1,203 @@
+import base64
+import copy
+import functools
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import tempfile
+import threading
+from pathlib import Path
+
+DATA_DIR = Path("data")
+USERS_FILE = DATA_DIR / "usuarios.json"
+# Usuários criados na primeira execução; as senhas são convertidas em hash ao carregar
+USERS_DEFAULT = {
+    "admin": {"senha": "admin123", "perfil": "admin"},
+    "usuario": {"senha": "usuario123", "perfil": "comum"}
+}
+
+# Custo do hash de senha (PBKDF2-SHA256). O número de iterações fica gravado em cada
+# hash: ao aumentar este valor, as senhas antigas são refeitas no próximo login.
+ALGORITMO_SENHA = 'pbkdf2_sha256'
+ITERACOES_SENHA = 600_000
+TAMANHO_SAL = 16
+
+def _filiais_permitidas(info):
+    # Filiais que o usuário pode ver, em ordem, ou None para todas: admins e usuários
+    # sem a chave "filiais" (ou com null) veem tudo
+    if info.get('perfil') == 'admin' or info.get('filiais') is None:
+        return None
+    return tuple(sorted(set(info['filiais'])))
+
+def gerar_hash_senha(senha, iteracoes=None):
+    iteracoes = iteracoes or ITERACOES_SENHA
+    sal = secrets.token_bytes(TAMANHO_SAL)
+    digest = hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), sal, iteracoes)
+    return '$'.join([
+        ALGORITMO_SENHA, str(iteracoes),
+        base64.b64encode(sal).decode('ascii'), base64.b64encode(digest).decode('ascii')
+    ])
+
+def _iteracoes_do_hash(senha_hash):
+    return int(senha_hash.split('$')[1])
+
+def verificar_senha(senha, senha_hash):
+    try:
+        algoritmo, iteracoes, sal, esperado = senha_hash.split('$')
+        if algoritmo != ALGORITMO_SENHA:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', senha.encode('utf-8'), base64.b64decode(sal), int(iteracoes))
+    except (ValueError, AttributeError):
+        return False
+    return hmac.compare_digest(digest, base64.b64decode(esperado))
+
+@functools.lru_cache(maxsize=1)
+def _hash_ficticio():
+    # Usado quando o usuário não existe, para o login levar o mesmo tempo nos dois casos
+    return gerar_hash_senha(secrets.token_hex(8))
+
+class UserStore:
+    # Usuários em memória, recarregados só quando o arquivo muda (mtime/tamanho).
+    # Gravações são atômicas: arquivo temporário no mesmo diretório + os.replace.
+
+    def __init__(self, caminho=USERS_FILE):
+        self.caminho = Path(caminho)
+        self._lock = threading.RLock()
+        self._usuarios = {}
+        self._assinatura = None
+        # Sessões já verificadas (usuário -> (perfil, filiais)); valem enquanto o arquivo não
+        # mudar, então a navegação custa só um stat e uma edição manual vale no próximo acesso
+        self._sessoes = {}
+
+    def _assinatura_arquivo(self):
+        try:
+            info = os.stat(self.caminho)
+        except FileNotFoundError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def _gravar(self, usuarios):
+        self.caminho.parent.mkdir(parents=True, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=self.caminho.parent, prefix='.usuarios_', suffix='.tmp')
+        try:
+            with os.fdopen(descritor, 'w') as f:
+                json.dump(usuarios, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            Path(temporario).unlink(missing_ok=True)
+            raise
+        self._usuarios = usuarios
+        self._assinatura = self._assinatura_arquivo()
+        self._sessoes.clear()
+
+    def _migrar_senhas(self, usuarios):
+        # Converte entradas antigas com a senha em texto puro ("senha") para "senha_hash"
+        migrados = False
+        for info in usuarios.values():
+            if 'senha' in info:
+                info['senha_hash'] = gerar_hash_senha(info.pop('senha'))
+                migrados = True
+        return migrados
+
+    def _carregar(self):
+        # Chamar com o lock; relê o arquivo só se ele mudou desde a última leitura
+        assinatura = self._assinatura_arquivo()
+        if assinatura is None:
+            usuarios = copy.deepcopy(USERS_DEFAULT)
+            self._migrar_senhas(usuarios)
+            self._gravar(usuarios)
+            return self._usuarios
+        if assinatura != self._assinatura:
+            with open(self.caminho) as f:
+                usuarios = json.load(f)
+            if self._migrar_senhas(usuarios):
+                self._gravar(usuarios)
+            else:
+                self._usuarios = usuarios
+                self._assinatura = assinatura
+                self._sessoes.clear()
+        return self._usuarios
+
+    def usuarios(self):
+        # Cópia sem os hashes, para exibição
+        with self._lock:
+            return {
+                nome: {k: v for k, v in info.items() if k != 'senha_hash'}
+                for nome, info in self._carregar().items()
+            }
+
+    def autenticar(self, usuario, senha):
+        with self._lock:
+            info = self._carregar().get(usuario)
+        if info is None:
+            verificar_senha(senha, _hash_ficticio())
+            return False
+        if not verificar_senha(senha, info['senha_hash']):
+            return False
+        with self._lock:
+            if _iteracoes_do_hash(info['senha_hash']) != ITERACOES_SENHA:
+                self._atualizar(usuario, {'senha_hash': gerar_hash_senha(senha)})
+            self._sessoes[usuario] = info['perfil'], _filiais_permitidas(info)
+        return True
+
+    def _sessao(self, usuario):
+        with self._lock:
+            # _carregar descarta as sessões se o arquivo mudou (ex.: filial revogada à mão)
+            usuarios = self._carregar()
+            if usuario not in self._sessoes:
+                info = usuarios[usuario]
+                self._sessoes[usuario] = info['perfil'], _filiais_permitidas(info)
+            return self._sessoes[usuario]
+
+    def perfil(self, usuario):
+        return self._sessao(usuario)[0]
+
+    def filiais(self, usuario):
+        # Tupla ordenada das filiais permitidas, ou None se o usuário vê todas
+        return self._sessao(usuario)[1]
+
+    def _atualizar(self, usuario, campos):
+        # Relê antes de alterar, para não sobrescrever edições feitas por outro processo
+        usuarios = copy.deepcopy(self._carregar())
+        usuarios[usuario].update(campos)
+        self._gravar(usuarios)
+
+    def adicionar_usuario(self, usuario, senha, perfil, filiais=None):
+        # filiais: lista das filiais que o usuário vê (None = todas).
+        # Retorna False se o usuário já existe
+        senha_hash = gerar_hash_senha(senha)
+        with self._lock:
+            usuarios = copy.deepcopy(self._carregar())
+            if usuario in usuarios:
+                return False
+            usuarios[usuario] = {'senha_hash': senha_hash, 'perfil': perfil}
+            if filiais is not None:
+                usuarios[usuario]['filiais'] = sorted(set(filiais))
+            self._gravar(usuarios)
+        return True
+
+    def alterar_senha(self, usuario, senha):
+        senha_hash = gerar_hash_senha(senha)
+        with self._lock:
+            self._atualizar(usuario, {'senha_hash': senha_hash})
+
+    def substituir(self, usuarios):
+        # Grava o conjunto inteiro; entradas com "senha" em texto puro viram hash
+        usuarios = copy.deepcopy(usuarios)
+        with self._lock:
+            atuais = self._carregar()
+            for nome, info in usuarios.items():
+                if 'senha' not in info and 'senha_hash' not in info and nome in atuais:
+                    info['senha_hash'] = atuais[nome]['senha_hash']
+            self._migrar_senhas(usuarios)
+            self._gravar(usuarios)
+
+    def encerrar_sessao(self, usuario):
+        with self._lock:
+            self._sessoes.pop(usuario, None)
+
+STORE = UserStore()